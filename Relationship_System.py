@@ -1,48 +1,920 @@
-import json
+import asyncio
+import datetime
 import os
-from typing import Dict, List
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from analytics import GraphStats
+from metrics import METRICS
+from mutations import MutationQueue
+from name_index import NameIndex
+from persistence import WriteBehindSaver
+from roll_engine import RollEngine, RolledCells, derived_matrix, derived_value, name_key, new_seed
+from storage import (
+    ChangeSet,
+    StorageBackend,
+    create_storage,
+    format_pair_key,
+    has_guild_data,
+    iter_json_relationships,
+)
+
+RELATIONSHIP_DESCRIPTIONS = {
+    1: "🔴 Вражда",
+    2: "🔴 Конфликт",
+    3: "🟡 Напряжение",
+    4: "🟡 Нейтрально",
+    5: "🟢 Дружелюбие",
+    6: "🟢 Симпатия",
+    7: "🔵 Дружба",
+    8: "🔵 Близость",
+    9: "💖 Любовь",
+    10: "💖 Душа",
+}
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Один объект int на пользователя вместо копии в каждом броске
+_USER_IDS: Dict[int, int] = {}
+
+
+def intern_user_id(user_id):
+    if user_id is None:
+        return None
+    return _USER_IDS.setdefault(user_id, user_id)
+
+
+def encode_timestamp(date: Optional[str]) -> Union[int, str, None]:
+    """ISO дата UTC → микросекунды от эпохи (int).
+
+    Дата, которая не восстанавливается в ту же строку (другой часовой пояс,
+    иной формат), хранится строкой как есть, чтобы JSON не менялся.
+    """
+    if not isinstance(date, str):
+        return date
+    try:
+        parsed = datetime.datetime.fromisoformat(date)
+    except ValueError:
+        return date
+    if parsed.utcoffset() != datetime.timedelta(0):
+        return date
+    micros = (parsed - EPOCH) // MICROSECOND
+    return micros if decode_timestamp(micros) == date else date
+
+
+def decode_timestamp(value: Union[int, str, None]) -> Optional[str]:
+    if isinstance(value, int):
+        return (EPOCH + value * MICROSECOND).isoformat()
+    return value
+
+
+class RollBatch:
+    """Общие данные одного броска (кто и когда), хранятся один раз на бросок.
+
+    seed задан у ленивых бросков: значения их ячеек выводятся, а не хранятся.
+    """
+
+    __slots__ = ("by", "at", "seed", "records")
+
+    def __init__(self, by: Optional[int], date: Optional[str], seed: Optional[int] = None):
+        self.by = intern_user_id(by)
+        self.at = encode_timestamp(date)
+        self.seed = seed
+        # Общие записи отношений этого броска (см. Relationship.shared)
+        self.records: Optional[dict] = None
+
+    @property
+    def date(self) -> Optional[str]:
+        return decode_timestamp(self.at)
+
+
+class Relationship:
+    """Неизменяемая запись отношения; описание выводится из значения"""
+
+    __slots__ = ("value", "roll", "reroll")
+
+    def __init__(self, value: int, roll: RollBatch, reroll: Optional[RollBatch] = None):
+        self.value = value
+        self.roll = roll
+        self.reroll = reroll
+
+    @classmethod
+    def shared(
+        cls, value: int, roll: RollBatch, reroll: Optional[RollBatch] = None
+    ) -> "Relationship":
+        """Запись (значение, бросок, переброс), общая для всех таких ячеек.
+
+        Записи неизменяемы, поэтому ячейки одного броска с одинаковым
+        значением могут ссылаться на один объект.
+        """
+        owner = reroll if reroll is not None else roll
+        records = owner.records
+        if records is None:
+            records = owner.records = {}
+        key = value if reroll is None else (value, roll)
+        record = records.get(key)
+        if record is None:
+            record = records[key] = cls(value, roll, reroll)
+        return record
+
+    @property
+    def description(self) -> str:
+        return RELATIONSHIP_DESCRIPTIONS[self.value]
+
+    def to_dict(self) -> dict:
+        """Запись в формате relationships.json"""
+        data = {
+            "value": self.value,
+            "description": self.description,
+            "rolled_by": self.roll.by,
+            "roll_date": self.roll.date,
+        }
+        if self.reroll is not None:
+            data["rerolled_by"] = self.reroll.by
+            data["reroll_date"] = self.reroll.date
+        return data
+
+    @classmethod
+    def from_dict(
+        cls, data: dict, batches: Dict[Tuple[Optional[int], Optional[str]], RollBatch]
+    ) -> "Relationship":
+        """Запись из формата relationships.json; batches объединяет общие броски"""
+
+        def batch(by, date):
+            key = (by, date)
+            found = batches.get(key)
+            if found is None:
+                found = batches[key] = RollBatch(by, date)
+            return found
+
+        reroll = None
+        if "rerolled_by" in data or "reroll_date" in data:
+            reroll = batch(data.get("rerolled_by"), data.get("reroll_date"))
+        return cls.shared(
+            int(data["value"]),
+            batch(data.get("rolled_by"), data.get("roll_date")),
+            reroll,
+        )
+
+
+class RelationshipGraph:
+    """Направленный граф отношений с прямым и обратным индексами.
+
+    Отношение from → to хранится один раз и доступно как через исходящие
+    связи from, так и через входящие связи to, поэтому удаление персонажа
+    и выборка его отношений стоят O(степени), а не O(всех отношений).
+    Агрегаты для аналитики (stats) обновляются вместе с индексами.
+
+    Персонажи, покрытые ленивым броском (cover), имеют отношения друг к другу
+    без хранимых ячеек: значение выводится из зерна более позднего из двух
+    бросков. Хранимая ячейка (переброс, импорт) всегда важнее выведенной.
+    Ленивый бросок сбрасывает агрегаты, и они пересчитываются при первом
+    обращении к stats.
+    """
 
-class RelationshipSystem:
     def __init__(self):
-        self.characters_file = "characters.json"
-        self.relationships_file = "relationships.json"
-        self.load_data()
+        self._outgoing: Dict[str, Dict[str, Relationship]] = {}
+        self._incoming: Dict[str, Dict[str, Relationship]] = {}
+        self._count = 0
+        # Персонаж → (порядковый номер броска, ленивый бросок, ключ имени)
+        self._covered: Dict[str, Tuple[int, RollBatch, int]] = {}
+        self._rolls = 0
+        # Хранимые ячейки между покрытыми персонажами (заменяют выведенные)
+        self._overlap = 0
+        self._stats: Optional[GraphStats] = GraphStats()
 
-    def load_data(self):
-        """Загрузка данных из JSON файлов с обработкой ошибок"""
-        try:
-            # Загрузка персонажей
-            if os.path.exists(self.characters_file):
-                with open(self.characters_file, "r", encoding="utf-8") as f:
-                    self.characters = json.load(f)
+    def __len__(self) -> int:
+        covered = len(self._covered)
+        return self._count + covered * (covered - 1) - self._overlap
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __contains__(self, pair: Tuple[str, str]) -> bool:
+        return self.get(*pair) is not None
+
+    @property
+    def stored_count(self) -> int:
+        """Число хранимых ячеек (без выведенных ленивым броском)"""
+        return self._count
+
+    @property
+    def stats(self) -> GraphStats:
+        """Агрегаты для аналитики"""
+        if self._stats is None:
+            self._stats = self._build_stats()
+        return self._stats
+
+    def _build_stats(self) -> GraphStats:
+        stats = GraphStats()
+        names = list(self._covered)
+        covered = [self._covered[name] for name in names]
+        values = derived_matrix(
+            [batch.seed for _, batch, _ in covered],
+            [rank for rank, _, _ in covered],
+            [key for _, _, key in covered],
+        )
+        if values is None:
+            stats.add_cells(
+                ((from_char, to_char, data.value) for (from_char, to_char), data in self.items()),
+                self._value,
+            )
+            return stats
+        # Хранимые ячейки между покрытыми персонажами заменяют выведенные в матрице
+        position = {name: number for number, name in enumerate(names)}
+        cells = []
+        for (from_char, to_char), data in self.stored_items():
+            row, column = position.get(from_char), position.get(to_char)
+            if row is not None and column is not None:
+                values[row, column] = data.value
             else:
-                self.characters = {}
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"⚠️ Ошибка загрузки characters.json: {e}")
-            self.characters = {}
+                cells.append((from_char, to_char, data.value))
+        stats.add_matrix(names, values)
+        stats.add_cells(cells, self._value)
+        return stats
 
-        try:
-            # Загрузка отношений
-            if os.path.exists(self.relationships_file):
-                with open(self.relationships_file, "r", encoding="utf-8") as f:
-                    self.relationships = json.load(f)
+    def _derived(self, from_char: str, to_char: str) -> Optional[Relationship]:
+        source = self._covered.get(from_char)
+        target = self._covered.get(to_char)
+        if source is None or target is None or from_char == to_char:
+            return None
+        batch = source[1] if source[0] > target[0] else target[1]
+        return Relationship.shared(derived_value(batch.seed, source[2], target[2]), batch)
+
+    def stored(self, from_char: str, to_char: str) -> Optional[Relationship]:
+        """Хранимая ячейка from_char → to_char или None"""
+        return self._outgoing.get(from_char, {}).get(to_char)
+
+    def get(self, from_char: str, to_char: str) -> Optional[Relationship]:
+        """Отношение from_char → to_char или None"""
+        data = self._outgoing.get(from_char, {}).get(to_char)
+        if data is None and self._covered:
+            data = self._derived(from_char, to_char)
+        return data
+
+    def _value(self, from_char: str, to_char: str) -> Optional[int]:
+        data = self.get(from_char, to_char)
+        return data.value if data is not None else None
+
+    def _link(self, from_char: str, to_char: str, data: Relationship) -> bool:
+        """Записать ячейку в оба индекса, вернуть True, если она новая"""
+        targets = self._outgoing.get(from_char)
+        if targets is None:
+            targets = self._outgoing[from_char] = {}
+        new = to_char not in targets
+        targets[to_char] = data
+        sources = self._incoming.get(to_char)
+        if sources is None:
+            sources = self._incoming[to_char] = {}
+        sources[from_char] = data
+        return new
+
+    def set(self, from_char: str, to_char: str, data: Relationship):
+        """Создать или заменить отношение from_char → to_char"""
+        stats = self._stats
+        old = self._value(from_char, to_char) if stats is not None else None
+        if self._link(from_char, to_char, data):
+            self._count += 1
+            if from_char in self._covered and to_char in self._covered:
+                self._overlap += 1
+        if stats is not None:
+            stats.on_set(from_char, to_char, old, data.value, self._value(to_char, from_char))
+
+    def add_roll(self, rolled: RolledCells, batch: RollBatch) -> Dict[int, Relationship]:
+        """Добавить отсутствующие отношения броска batch.
+
+        Ячейки должны быть новыми: старые значения не ищутся, записи общие
+        на значение, индексы заполняются группами по персонажам, агрегаты —
+        по матрице броска. Возвращает записи по значениям.
+        """
+        records = {value: Relationship.shared(value, batch) for value in RELATIONSHIP_DESCRIPTIONS}
+        record_of = records.__getitem__
+        for index, by_target in ((self._outgoing, False), (self._incoming, True)):
+            for name, others, values in rolled.runs(by_target):
+                links = index.get(name)
+                if links is None:
+                    links = index[name] = {}
+                links.update(zip(others, map(record_of, values)))
+        self._count += len(rolled)
+        if self._stats is not None:
+            block = rolled.block()
+            if block is None:
+                self._stats.add_cells(rolled, self._value)
             else:
-                self.relationships = {}
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"⚠️ Ошибка загрузки relationships.json: {e}")
-            self.relationships = {}
+                self._stats.add_matrix(rolled.names, block, self._value)
+        return records
+
+    def remove_character(self, name: str) -> int:
+        """Удалить все исходящие и входящие отношения персонажа"""
+        stats = self._stats
+        removed = 0
+        if name in self._covered:
+            for other in self._covered:
+                if other == name:
+                    continue
+                for from_char, to_char in ((name, other), (other, name)):
+                    if to_char in self._outgoing.get(from_char, ()):
+                        self._overlap -= 1
+                    else:
+                        if stats is not None:
+                            derived = self._derived(from_char, to_char)
+                            stats.on_remove(from_char, to_char, derived.value)
+                        removed += 1
+            del self._covered[name]
+        stored = 0
+        for to_char, data in self._outgoing.pop(name, {}).items():
+            sources = self._incoming[to_char]
+            del sources[name]
+            if not sources:
+                del self._incoming[to_char]
+            if stats is not None:
+                stats.on_remove(name, to_char, data.value)
+            stored += 1
+        for from_char, data in self._incoming.pop(name, {}).items():
+            targets = self._outgoing[from_char]
+            del targets[name]
+            if not targets:
+                del self._outgoing[from_char]
+            if stats is not None:
+                stats.on_remove(from_char, name, data.value)
+            stored += 1
+        self._count -= stored
+        return removed + stored
+
+    def cover(self, names: Iterable[str], batch: RollBatch) -> int:
+        """Покрыть персонажей ленивым броском batch (с зерном).
+
+        Возвращает число новых выведенных отношений. Значения не вычисляются:
+        стоимость O(персонажей и их хранимых ячеек), а не O(пар).
+        """
+        rank = self._rolls
+        self._rolls += 1
+        covered = self._covered
+        added = 0
+        for name in names:
+            if name in covered:
+                continue
+            # Хранимые ячейки с уже покрытыми персонажами заменяют выведенные
+            overlap = sum(other in covered for other in self._outgoing.get(name, ()))
+            overlap += sum(other in covered for other in self._incoming.get(name, ()))
+            added += 2 * len(covered) - overlap
+            self._overlap += overlap
+            covered[name] = (rank, batch, name_key(name))
+        if added:
+            self._stats = None
+        return added
+
+    def covered(self, name: str) -> bool:
+        """Покрыт ли персонаж ленивым броском"""
+        return name in self._covered
+
+    def _derived_targets(self, name: str, incoming: bool) -> Dict[str, Relationship]:
+        if name not in self._covered:
+            return {}
+        pairs = (
+            ((other, name) for other in self._covered)
+            if incoming
+            else ((name, other) for other in self._covered)
+        )
+        derived = {}
+        for from_char, to_char in pairs:
+            if from_char != to_char:
+                derived[from_char if incoming else to_char] = self._derived(from_char, to_char)
+        return derived
+
+    def outgoing(self, name: str) -> Dict[str, Relationship]:
+        """Исходящие отношения персонажа {to: data} (только для чтения)"""
+        stored = self._outgoing.get(name, {})
+        if name not in self._covered:
+            return stored
+        # Выведенные значения вычисляются на лету, хранимые — поверх них
+        merged = self._derived_targets(name, incoming=False)
+        merged.update(stored)
+        return merged
+
+    def incoming(self, name: str) -> Dict[str, Relationship]:
+        """Входящие отношения персонажа {from: data} (только для чтения)"""
+        stored = self._incoming.get(name, {})
+        if name not in self._covered:
+            return stored
+        merged = self._derived_targets(name, incoming=True)
+        merged.update(stored)
+        return merged
+
+    def stored_items(self) -> Iterator[Tuple[Tuple[str, str], Relationship]]:
+        """Хранимые отношения в виде ((from, to), data) — то, что пишется на диск"""
+        for from_char, targets in self._outgoing.items():
+            for to_char, data in targets.items():
+                yield (from_char, to_char), data
+
+    def items(self) -> Iterator[Tuple[Tuple[str, str], Relationship]]:
+        """Все отношения в виде ((from, to), data), включая выведенные"""
+        yield from self.stored_items()
+        for from_char in self._covered:
+            stored = self._outgoing.get(from_char, ())
+            for to_char in self._covered:
+                if to_char != from_char and to_char not in stored:
+                    yield (from_char, to_char), self._derived(from_char, to_char)
+
+    @classmethod
+    def from_pairs(
+        cls, pairs: Iterable[Tuple[Tuple[str, str], dict]]
+    ) -> "RelationshipGraph":
+        """Построить граф из последовательности ((from, to), data в формате JSON)"""
+        graph = cls()
+        batches = {}
+        # Ключи разбираются в новые строки; одна строка на имя вместо одной на ячейку
+        names: Dict[str, str] = {}
+        cells = []
+        for (from_char, to_char), data in pairs:
+            from_char = names.setdefault(from_char, from_char)
+            to_char = names.setdefault(to_char, to_char)
+            data = Relationship.from_dict(data, batches)
+            if graph._link(from_char, to_char, data):
+                cells.append((from_char, to_char, data.value))
+        graph._count = len(cells)
+        graph._stats.add_cells(cells, graph._value)
+        return graph
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, dict]) -> "RelationshipGraph":
+        """Построить граф из формата relationships.json (ключи str((from, to)))"""
+        return cls.from_pairs(iter_json_relationships(raw))
+
+    def to_json(self) -> Dict[str, dict]:
+        """Сериализация хранимых отношений в формат relationships.json"""
+        return {
+            format_pair_key(from_char, to_char): data.to_dict()
+            for (from_char, to_char), data in self.stored_items()
+        }
+
+
+def lazy_rolls(characters: Dict[str, dict]) -> List[Tuple[RollBatch, List[str]]]:
+    """Ленивые броски из записей персонажей (rolled_by, roll_date, roll_seed) по порядку"""
+    rolls: Dict[tuple, List[str]] = {}
+    for name, data in characters.items():
+        if isinstance(data, dict) and data.get("roll_seed") is not None:
+            key = (data.get("roll_date") or "", data["roll_seed"], data.get("rolled_by"))
+            rolls.setdefault(key, []).append(name)
+    return [
+        (RollBatch(by, date or None, seed), names)
+        for (date, seed, by), names in sorted(rolls.items(), key=lambda item: item[0][:2])
+    ]
+
+
+class RelationshipSystem:
+    """Персонажи и отношения с отложенным сохранением в хранилище.
+
+    Записи отношений не изменяются на месте, а заменяются целиком: снимок
+    для фоновой записи ссылается на них без копирования. Все изменения идут
+    через методы системы, чтобы хранилище могло записывать только их; команды
+    вызывают их через submit() — очередь сервера с одним писателем.
+
+    При ROLL_MODE=lazy бросок не создаёт ячеек: персонажи отмечаются броском
+    с зерном, значения выводятся (см. RelationshipGraph.cover), а хранятся
+    только перебросы и импортированные ячейки.
+    """
+
+    def __init__(self, storage: Optional[StorageBackend] = None):
+        self.storage = storage or create_storage()
+        self.lazy_rolls = os.getenv("ROLL_MODE", "eager").strip().lower() == "lazy"
+        self.saver = WriteBehindSaver(
+            self._snapshot,
+            self._write,
+            delay=float(os.getenv("SAVE_DELAY", "2.0")),
+        )
+        self.mutations = MutationQueue(self.schedule_save)
+        # Реестр и сервер, если система загружена через GuildRegistry
+        self.registry: Optional["GuildRegistry"] = None
+        self.guild_id: Optional[int] = None
+        self.unloaded = False
+        self.load_data()
+
+    def load_data(self):
+        """Загрузка данных из хранилища"""
+        self._install(self._read())
+
+    def _read(self):
+        """Прочитать хранилище и построить новое состояние (можно в рабочем потоке)"""
+        start = time.perf_counter()
+        characters, relationships = self.storage.load()
+        relationships = RelationshipGraph.from_pairs(relationships)
+        for batch, names in lazy_rolls(characters):
+            relationships.cover(names, batch)
+        roller = RollEngine()
+        # Пары покрытых ленивым броском персонажей в матрицу не попадают (см. covered)
+        roller.load(
+            (from_char, to_char, data.value)
+            for (from_char, to_char), data in relationships.stored_items()
+        )
+        METRICS.observe_io(
+            "load", time.perf_counter() - start, self.storage.last_load_bytes
+        )
+        return characters, relationships, roller
+
+    def _install(self, state):
+        """Заменить состояние системы прочитанным из хранилища целиком"""
+        self.characters: Dict[str, dict]
+        self.characters, self.relationships, self.roller = state
+        self.changes = ChangeSet()
+        # Индекс имён строится при первом автодополнении
+        self._name_index: Optional[NameIndex] = None
+        # Версия данных растёт при каждом изменении (для кэшей отображения)
+        self.version = getattr(self, "version", 0) + 1
+
+    async def reload(self) -> bool:
+        """Перечитать данные, если их изменил другой процесс (через submit)"""
+        if not self.storage.changed_externally():
+            return False
+        # Свои изменения сначала записываются, чтобы попасть в перечитанные данные
+        await self.saver.flush()
+        if self.saver.dirty:
+            # Запись не удалась — не теряем несохранённые изменения
+            return False
+        self._install(await asyncio.to_thread(self._read))
+        print(f"🔄 Данные {self.storage.name} перечитаны: изменены другим процессом")
+        return True
+
+    @property
+    def name_index(self) -> NameIndex:
+        """Индекс имён персонажей (префиксы и опечатки)"""
+        if self._name_index is None:
+            self._name_index = NameIndex(self.characters)
+        return self._name_index
 
     def save_data(self):
-        """Сохранение данных в JSON файлы с обработкой ошибок"""
+        """Синхронное сохранение накопленных изменений"""
+        self._write(self._snapshot())
+
+    def schedule_save(self):
+        """Запланировать отложенное сохранение (серия изменений — одна запись)"""
+        self.saver.schedule()
+
+    async def submit(self, mutation, *args):
+        """Выполнить изменение mutation(*args) в очереди сервера (с сохранением)"""
+        if self.unloaded:
+            # Сервер выгрузили, пока команда ждала (скачивание вложения и т.п.):
+            # изменение применяется к заново загруженной системе сервера
+            if self.registry is None or getattr(mutation, "__self__", None) is not self:
+                raise RuntimeError("данные сервера выгружены из памяти")
+            current = await self.registry.get(self.guild_id)
+            return await current.submit(getattr(current, mutation.__name__), *args)
+        return await self.mutations.submit(mutation, *args)
+
+    async def flush(self):
+        """Дождаться применения очереди и записи всех накопленных изменений"""
+        await self.mutations.drain()
+        await self.saver.flush()
+
+    def _snapshot(self):
+        """Согласованный снимок для хранилища; вызывается в цикле событий"""
+        changes, self.changes = self.changes, ChangeSet()
+        return self.storage.snapshot(self.characters, self.relationships, changes)
+
+    def _write(self, snapshot):
+        """Запись снимка в хранилище с замером; может выполняться в рабочем потоке"""
+        start = time.perf_counter()
+        written = self.storage.write(snapshot)
+        METRICS.observe_io("save", time.perf_counter() - start, written or 0)
+
+    def add_character(self, name: str, added_by: int, added_date: str):
+        """Добавить персонажа"""
+        data = {"added_by": added_by, "added_date": added_date}
+        self.characters[name] = data
+        if self._name_index is not None:
+            self._name_index.add(name)
+        self.changes.add_character(name, data)
+        self.changes.record({"op": "add", "name": name, "by": added_by, "at": added_date})
+        self.version += 1
+
+    def add_characters(self, names: Iterable[str], added_by: int, added_date: str) -> List[str]:
+        """Добавить новых персонажей, вернуть добавленные имена (существующие пропускаются)"""
+        added = [name for name in names if name not in self.characters]
+        for name in added:
+            self.add_character(name, added_by, added_date)
+        return added
+
+    def remove_characters(
+        self, names: Iterable[str], removed_by: Optional[int] = None
+    ) -> Tuple[List[str], int]:
+        """Удалить найденных персонажей, вернуть (удалённые имена, число отношений)"""
+        removed = [name for name in names if name in self.characters]
+        relationships = 0
+        for name in removed:
+            relationships += self.remove_character(name, removed_by)
+        return removed, relationships
+
+    def remove_character(self, name: str, removed_by: Optional[int] = None) -> int:
+        """Удалить персонажа и все его отношения, вернуть число удалённых отношений"""
+        self.characters.pop(name, None)
+        if self._name_index is not None:
+            self._name_index.remove(name)
+        self.changes.remove_character(name)
+        self.changes.record({"op": "remove", "name": name, "by": removed_by})
+        self.roller.on_character_removed(name)
+        self.version += 1
+        return self.relationships.remove_character(name)
+
+    def set_relationship(self, from_char: str, to_char: str, data: Relationship):
+        """Создать или заменить отношение from_char → to_char"""
+        self.relationships.set(from_char, to_char, data)
+        self.changes.set_relationship((from_char, to_char), data)
+        self.changes.record(
+            {"op": "set", "from": from_char, "to": to_char, "data": data.to_dict()}
+        )
+        self.roller.on_set(from_char, to_char, data.value)
+        self.version += 1
+
+    def import_data(
+        self,
+        characters: List[str],
+        relationships: Dict[Tuple[str, str], dict],
+        imported_by: int,
+        import_date: str,
+    ) -> Tuple[int, int]:
+        """Применить проверенные данные импорта, вернуть (новых персонажей, отношений)"""
+        added = 0
+        for name in characters:
+            if name not in self.characters:
+                self.add_character(name, imported_by, import_date)
+                added += 1
+        batches = {}
+        for (from_char, to_char), data in relationships.items():
+            data = dict(data)
+            data.setdefault("rolled_by", imported_by)
+            data.setdefault("roll_date", import_date)
+            self.set_relationship(from_char, to_char, Relationship.from_dict(data, batches))
+        return added, len(relationships)
+
+    def apply_import(self, data, imported_by: int, import_date: str) -> Optional[Tuple[int, int]]:
+        """Применить разобранный импорт (bulk.ImportData) в очереди сервера.
+
+        Пока файлы разбирались, персонажей могли удалить — ссылки отношений
+        проверяются ещё раз. При ошибках они дописываются в data.errors,
+        ничего не применяется и возвращается None.
+        """
+        available = set(self.characters) | set(data.characters)
+        for pair in data.relationships:
+            for name in pair:
+                if name not in available:
+                    data.errors.append(f"Персонаж `{name}` из отношений не найден")
+                    available.add(name)
+        if data.errors:
+            return None
+        return self.import_data(data.characters, data.relationships, imported_by, import_date)
+
+    def roll_missing(self, rolled_by: int, roll_date: str) -> int:
+        """Бросить все недостающие направленные отношения, вернуть их число"""
+        if self.lazy_rolls:
+            return self.roll_lazy(rolled_by, roll_date)
+        names = list(self.characters)
+        rolled = self.roller.roll_missing(names, self.relationships)
+        if not rolled:
+            return 0
+        records = self.relationships.add_roll(rolled, RollBatch(rolled_by, roll_date))
+        if self.storage.row_changes:
+            self.changes.set_relationships(
+                ((from_char, to_char), records[value]) for from_char, to_char, value in rolled
+            )
+        # Имена пишутся в журнал один раз, ячейки — тройками номеров и значений
+        self.changes.record(
+            {"op": "roll", "by": rolled_by, "at": roll_date, "names": names, "cells": rolled.flat()}
+        )
+        self.version += 1
+        return len(rolled)
+
+    def roll_lazy(self, rolled_by: int, roll_date: str) -> int:
+        """Ленивый бросок: отметить непокрытых персонажей, вернуть число новых отношений.
+
+        Записывается только отметка броска в записях персонажей — O(персонажей),
+        а не O(пар).
+        """
+        names = [name for name in self.characters if not self.relationships.covered(name)]
+        if not names:
+            return 0
+        batch = RollBatch(rolled_by, roll_date, new_seed())
+        added = self.relationships.cover(names, batch)
+        for name in names:
+            data = dict(
+                self.characters[name],
+                rolled_by=rolled_by,
+                roll_date=roll_date,
+                roll_seed=batch.seed,
+            )
+            self.characters[name] = data
+            self.changes.add_character(name, data)
+        self.changes.record(
+            {"op": "lazy_roll", "by": rolled_by, "at": roll_date, "seed": batch.seed, "names": names}
+        )
+        self.version += 1
+        return added
+
+    def reroll(
+        self, pairs: Iterable[Tuple[str, str]], rerolled_by: int, reroll_date: str
+    ) -> List[Tuple[str, str, int, int, int]]:
+        """Перебросить существующие отношения одним проходом.
+
+        Возвращает (from, to, старое значение, бросок, новое значение) для
+        каждой найденной пары; отсутствующие пары пропускаются.
+        """
+        found = []
+        for from_char, to_char in pairs:
+            data = self.relationships.get(from_char, to_char)
+            if data is not None:
+                found.append((from_char, to_char, data))
+        if not found:
+            return []
+
+        rolls, values = self.roller.reroll([data.value for _, _, data in found])
+        batch = RollBatch(rerolled_by, reroll_date)
+        results = []
+        for from_char, to_char, data in found:
+            if data.roll.seed is not None and self.relationships.stored(from_char, to_char) is None:
+                # Выведенная ячейка становится хранимой: журналу нужен исходный бросок
+                self.changes.record(
+                    {"op": "set", "from": from_char, "to": to_char, "data": data.to_dict()}
+                )
+        for (from_char, to_char, data), roll, value in zip(found, rolls, values):
+            # Исходный бросок сохраняется, переброс записывается отдельно
+            updated = Relationship.shared(value, data.roll, batch)
+            self.relationships.set(from_char, to_char, updated)
+            self.changes.set_relationship((from_char, to_char), updated)
+            self.roller.on_set(from_char, to_char, value)
+            results.append((from_char, to_char, data.value, roll, value))
+        self.changes.record(
+            {
+                "op": "reroll",
+                "by": rerolled_by,
+                "at": reroll_date,
+                "cells": [[from_char, to_char, value] for from_char, to_char, _, _, value in results],
+            }
+        )
+        self.version += 1
+        return results
+
+    def reroll_scope(
+        self, character_name: Optional[str], direction: str, rerolled_by: int, reroll_date: str
+    ) -> List[Tuple[str, str, int, int, int]]:
+        """Перебросить все отношения графа или персонажа (все, исходящие, входящие).
+
+        Пары выбираются в момент применения, поэтому видят актуальный граф.
+        """
+        relationships = self.relationships
+        if not character_name:
+            pairs = [pair for pair, _ in relationships.items()]
+        else:
+            pairs = []
+            if direction in ("все", "исходящие"):
+                pairs += [(character_name, other) for other in relationships.outgoing(character_name)]
+            if direction in ("все", "входящие"):
+                pairs += [(other, character_name) for other in relationships.incoming(character_name)]
+        return self.reroll(pairs, rerolled_by, reroll_date)
+
+    # Примерная стоимость записей в памяти (записи, индексы, строки), байт
+    CHARACTER_BYTES = 600
+    RELATIONSHIP_BYTES = 300
+    NAME_INDEX_BYTES = 2000
+
+    def estimated_size(self) -> int:
+        """Оценка занимаемой памяти для бюджета кэша серверов.
+
+        Выведенные ленивым броском отношения памяти не занимают и не считаются.
+        """
+        size = (
+            len(self.characters) * self.CHARACTER_BYTES
+            + self.relationships.stored_count * self.RELATIONSHIP_BYTES
+        )
+        if self._name_index is not None:
+            size += len(self._name_index) * self.NAME_INDEX_BYTES
+        return size
+
+
+def _report_prefetch(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Ошибка фоновой загрузки данных сервера: {task.exception()}")
+
+
+class GuildRegistry:
+    """Данные серверов: ленивая загрузка и вытеснение по LRU.
+
+    Система сервера загружается при первой команде на нём. Когда оценка
+    памяти резидентных серверов превышает бюджет (GUILD_CACHE_MB), давно не
+    использовавшиеся серверы сохраняются и выгружаются.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        if budget_bytes is None:
+            budget_bytes = int(float(os.getenv("GUILD_CACHE_MB", "256")) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self._systems: "OrderedDict[int, RelationshipSystem]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._evicting: Dict[int, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._systems)
+
+    def resident(self) -> Dict[int, RelationshipSystem]:
+        """Загруженные серверы (от давно использованных к недавним)"""
+        return dict(self._systems)
+
+    def peek(self, guild_id: int) -> Optional[RelationshipSystem]:
+        """Загруженная система сервера или None (без загрузки)"""
+        return self._systems.get(guild_id)
+
+    def prefetch(self, guild_id: int):
+        """Начать загрузку сервера в фоне, не дожидаясь её (для автодополнения)"""
+        if guild_id not in self._systems and guild_id not in self._loading:
+            self._start_load(guild_id).add_done_callback(_report_prefetch)
+
+    def _start_load(self, guild_id: int) -> asyncio.Task:
+        loading = self._loading.get(guild_id)
+        if loading is None:
+            loading = asyncio.get_running_loop().create_task(self._load(guild_id))
+            self._loading[guild_id] = loading
+        return loading
+
+    async def get(self, guild_id: int) -> RelationshipSystem:
+        """Система отношений сервера (загружается при первом обращении)"""
+        while True:
+            system = self._systems.get(guild_id)
+            if system is None:
+                # Одновременные первые команды сервера ждут одну и ту же загрузку
+                await asyncio.shield(self._start_load(guild_id))
+                # Пока ждали, сервер могли снова вытеснить — проверяем заново
+                continue
+            self._systems.move_to_end(guild_id)
+            self._evict()
+            if system.storage.changed_externally():
+                # Другой процесс (кластер шардов) изменил данные сервера
+                await system.submit(system.reload)
+            if self._systems.get(guild_id) is system:
+                return system
+
+    async def _load(self, guild_id: int) -> RelationshipSystem:
         try:
-            with open(self.characters_file, "w", encoding="utf-8") as f:
-                json.dump(self.characters, f, ensure_ascii=False, indent=2)
-        except IOError as e:
-            print(f"⚠️ Ошибка сохранения characters.json: {e}")
+            # Выгружаемый сервер сначала должен дописать свои изменения
+            evicting = self._evicting.get(guild_id)
+            if evicting is not None:
+                await evicting
+            system = await asyncio.to_thread(self._open, guild_id)
+            self._systems[guild_id] = system
+            self._evict()
+            return system
+        finally:
+            del self._loading[guild_id]
+
+    def _open(self, guild_id: int) -> RelationshipSystem:
+        system = RelationshipSystem(create_storage(guild_id))
+        system.registry = self
+        system.guild_id = guild_id
+        return system
 
+    def _evict(self):
+        """Вытеснить давно не использовавшиеся серверы сверх бюджета памяти"""
+        total = self._total_size()
+        # Последний (текущий) сервер не вытесняется, даже если он один больше бюджета
+        while total > self.budget_bytes and len(self._systems) > 1:
+            guild_id, system = self._systems.popitem(last=False)
+            # Команды, ещё держащие систему, отправят изменения в новую (submit)
+            system.unloaded = True
+            total -= system.estimated_size()
+            task = asyncio.get_running_loop().create_task(self._unload(guild_id, system))
+            self._evicting[guild_id] = task
+
+    async def _unload(self, guild_id: int, system: RelationshipSystem):
         try:
-            with open(self.relationships_file, "w", encoding="utf-8") as f:
-                json.dump(self.relationships, f, ensure_ascii=False, indent=2)
-        except IOError as e:
-            print(f"⚠️ Ошибка сохранения relationships.json: {e}")
+            await system.flush()
+            system.storage.close()
+            print(f"💤 Данные сервера {guild_id} выгружены из памяти")
+        finally:
+            if self._evicting.get(guild_id) is asyncio.current_task():
+                del self._evicting[guild_id]
+
+    def _total_size(self) -> int:
+        return sum(system.estimated_size() for system in self._systems.values())
+
+    async def preload(self, guild_ids: Iterable[int]) -> int:
+        """Фоновая загрузка серверов с сохранёнными данными, пока хватает бюджета.
+
+        Команды во время предзагрузки не ждут её окончания: сервер, к которому
+        обратились, загружается сразу (или присоединяется к уже идущей загрузке).
+        """
+        loaded = 0
+        for guild_id in guild_ids:
+            if self._total_size() >= self.budget_bytes:
+                break
+            if guild_id in self._systems or not has_guild_data(guild_id):
+                continue
+            await self.get(guild_id)
+            loaded += 1
+        return loaded
+
+    async def flush_all(self):
+        """Сохранить изменения всех загруженных серверов"""
+        await asyncio.gather(
+            *(system.flush() for system in self._systems.values()),
+            *self._evicting.values(),
+        )
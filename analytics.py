@@ -0,0 +1,208 @@
+"""Аналитика графа отношений, обновляемая при каждом изменении.
+
+Для каждого персонажа хранятся агрегаты входящих и исходящих отношений
+(сумма, количество, гистограмма значений 1–10, из неё — минимум и максимум),
+кто относится к нему с каким значением, а также множество пар со взаимной
+любовью. Установка и удаление отношения обновляют их за O(1), поэтому
+запросы «кто любит X больше всех», «взаимная любовь» и «среднее отношение»
+не перебирают весь граф.
+"""
+
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy — необязательная зависимость
+    np = None
+
+VALUES = range(1, 11)
+# Взаимная любовь: оба направления не ниже этого значения (💖 Любовь, 💖 Душа)
+LOVE_MIN = 9
+
+
+class Aggregate:
+    """Сумма, количество и гистограмма значений отношений"""
+
+    __slots__ = ("count", "total", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.histogram = [0] * 11  # Индекс — значение 1..10
+
+    def add(self, value: int, count: int = 1):
+        self.count += count
+        self.total += value * count
+        self.histogram[value] += count
+
+    def discard(self, value: int):
+        self.count -= 1
+        self.total -= value
+        self.histogram[value] -= 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def min(self) -> Optional[int]:
+        return next((value for value in VALUES if self.histogram[value]), None)
+
+    @property
+    def max(self) -> Optional[int]:
+        return next((value for value in reversed(VALUES) if self.histogram[value]), None)
+
+
+def _pair(a: str, b: str) -> Tuple[str, str]:
+    return (a, b) if a <= b else (b, a)
+
+
+class GraphStats:
+    """Агрегаты графа; обновляются методами RelationshipGraph"""
+
+    def __init__(self):
+        self.total = Aggregate()
+        self.incoming: Dict[str, Aggregate] = {}
+        self.outgoing: Dict[str, Aggregate] = {}
+        # К кому → значение → от кого (для «кто любит X больше всех»)
+        self._admirers: Dict[str, Dict[int, Set[str]]] = {}
+        self.mutual_love: Set[Tuple[str, str]] = set()
+
+    def on_set(
+        self,
+        from_char: str,
+        to_char: str,
+        old: Optional[int],
+        new: int,
+        reverse: Optional[int],
+    ):
+        """Отношение from → to стало new (было old); reverse — значение to → from"""
+        if old is not None:
+            self.on_remove(from_char, to_char, old)
+        self._add(from_char, to_char, new)
+        if new >= LOVE_MIN and reverse is not None and reverse >= LOVE_MIN:
+            self.mutual_love.add(_pair(from_char, to_char))
+
+    def add_cells(
+        self,
+        cells: Iterable[Tuple[str, str, int]],
+        value_of: Callable[[str, str], Optional[int]],
+    ):
+        """Учесть разом много новых отношений (бросок, загрузка графа).
+
+        Агрегаты обновляются по группам (персонаж, значение), а не по ячейкам.
+        value_of(from, to) — значение пары после добавления всех ячеек или
+        None; по нему взаимная любовь проверяется один раз в конце.
+        """
+        cells = list(cells)
+        for value, count in Counter(map(itemgetter(2), cells)).items():
+            self.total.add(value, count)
+        for table, key in ((self.outgoing, itemgetter(0, 2)), (self.incoming, itemgetter(1, 2))):
+            for (name, value), count in Counter(map(key, cells)).items():
+                self._aggregate(table, name).add(value, count)
+        sources: Dict[Tuple[str, int], List[str]] = defaultdict(list)
+        for from_char, to_char, value in cells:
+            sources[to_char, value].append(from_char)
+        for (to_char, value), names in sources.items():
+            by_value = self._admirers.get(to_char)
+            if by_value is None:
+                by_value = self._admirers[to_char] = {}
+            by_value.setdefault(value, set()).update(names)
+        for from_char, to_char, value in cells:
+            if value >= LOVE_MIN:
+                reverse = value_of(to_char, from_char)
+                if reverse is not None and reverse >= LOVE_MIN:
+                    self.mutual_love.add(_pair(from_char, to_char))
+
+    def add_matrix(
+        self,
+        names: Sequence[str],
+        values: "np.ndarray",
+        value_of: Optional[Callable[[str, str], Optional[int]]] = None,
+    ):
+        """Учесть все отношения между names по матрице значений (NumPy).
+
+        Строка — от кого, столбец — к кому, 0 — нет отношения. Агрегаты
+        считаются по строкам и столбцам матрицы, а не по ячейкам. Если
+        матрица — только новые ячейки (бросок), value_of(from, to) даёт
+        значение обратной пары, которой в матрице нет.
+        """
+        for value in VALUES:
+            cells = values == value
+            self.total.add(value, int(cells.sum()))
+            for table, counts in (
+                (self.outgoing, cells.sum(axis=1)),
+                (self.incoming, cells.sum(axis=0)),
+            ):
+                for number in np.flatnonzero(counts).tolist():
+                    self._aggregate(table, names[number]).add(value, int(counts[number]))
+        # Поклонники — группами (к кому, значение) после одной сортировки ячеек
+        targets, sources = np.nonzero(values.T)
+        groups = targets * 11 + values.T[targets, sources]
+        order = np.argsort(groups, kind="stable")
+        groups = groups[order]
+        starts = (np.flatnonzero(np.diff(groups)) + 1).tolist()
+        sources = np.asarray(names, dtype=object)[sources[order]].tolist()
+        groups = groups.tolist()
+        bounds = [0] + starts + [len(groups)]
+        for start, end in zip(bounds, bounds[1:]):
+            target, value = divmod(groups[start], 11)
+            by_value = self._admirers.get(names[target])
+            if by_value is None:
+                by_value = self._admirers[names[target]] = {}
+            by_value.setdefault(value, set()).update(sources[start:end])
+        loved = values >= LOVE_MIN
+        for row, column in zip(*(axis.tolist() for axis in np.nonzero(np.triu(loved & loved.T, 1)))):
+            self.mutual_love.add(_pair(names[row], names[column]))
+        if value_of is not None:
+            # Новая ячейка, обратная которой была в графе раньше
+            for row, column in zip(*(axis.tolist() for axis in np.nonzero(loved & (values.T == 0)))):
+                reverse = value_of(names[column], names[row])
+                if reverse is not None and reverse >= LOVE_MIN:
+                    self.mutual_love.add(_pair(names[row], names[column]))
+
+    @staticmethod
+    def _aggregate(table: Dict[str, Aggregate], name: str) -> Aggregate:
+        aggregate = table.get(name)
+        if aggregate is None:
+            aggregate = table[name] = Aggregate()
+        return aggregate
+
+    def _add(self, from_char: str, to_char: str, value: int):
+        self.total.add(value)
+        self._aggregate(self.outgoing, from_char).add(value)
+        self._aggregate(self.incoming, to_char).add(value)
+        by_value = self._admirers.get(to_char)
+        if by_value is None:
+            by_value = self._admirers[to_char] = {}
+        sources = by_value.get(value)
+        if sources is None:
+            sources = by_value[value] = set()
+        sources.add(from_char)
+
+    def on_remove(self, from_char: str, to_char: str, value: int):
+        """Отношение from → to со значением value удалено"""
+        self.total.discard(value)
+        for table, name in ((self.outgoing, from_char), (self.incoming, to_char)):
+            aggregate = table[name]
+            aggregate.discard(value)
+            if not aggregate.count:
+                del table[name]
+        by_value = self._admirers[to_char]
+        sources = by_value[value]
+        sources.discard(from_char)
+        if not sources:
+            del by_value[value]
+            if not by_value:
+                del self._admirers[to_char]
+        self.mutual_love.discard(_pair(from_char, to_char))
+
+    def favorite(self, name: str) -> Tuple[Optional[int], List[str]]:
+        """Наибольшее входящее значение персонажа и кто так к нему относится"""
+        by_value = self._admirers.get(name)
+        if not by_value:
+            return None, []
+        best = max(by_value)
+        return best, sorted(by_value[best])
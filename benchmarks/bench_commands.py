@@ -0,0 +1,176 @@
+"""Офлайн-бенчмарк команд RelationshipCog (без сети).
+
+Команды вызываются напрямую с поддельными ctx/message, данные пишутся во
+временный каталог. Для каждого размера измеряются задержка и пиковая память
+(tracemalloc, отдельным прогоном, чтобы трассировка не искажала время).
+
+Запуск:
+  python benchmarks/bench_commands.py --sizes 10,100,1000 --output bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Фоновое сохранение не должно срабатывать посреди замеров
+os.environ.setdefault("SAVE_DELAY", "3600")
+
+GUILD_ID = 1
+# Второй сервер с ленивыми бросками (ROLL_MODE=lazy)
+LAZY_GUILD_ID = 2
+AUTHOR_ID = 303846448565321729
+
+
+class FakeContext:
+    """Минимальный ctx: всё, что читают команды кога, и запись отправленного"""
+
+    def __init__(self, guild_id: int = GUILD_ID):
+        self.author = SimpleNamespace(id=AUTHOR_ID, bot=False)
+        self.guild = SimpleNamespace(id=guild_id)
+        self.channel = SimpleNamespace(id=guild_id)
+        self.message = SimpleNamespace(
+            created_at=datetime.datetime.now(datetime.timezone.utc), attachments=[]
+        )
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+        return SimpleNamespace(id=len(self.sent))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def measure(func, trace_memory: bool):
+    """Время (с) и пик памяти (байт) выполнения func()"""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    if asyncio.iscoroutine(result):
+        await result
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+async def run_scenario(size: int, trace_memory: bool):
+    """Прогнать все операции для size персонажей, вернуть {операция: (с, байт)}"""
+    import discord
+    from discord.ext import commands
+
+    import cogs.relationships as relationships
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["DATA_DIR"] = data_dir
+        bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+        cog = relationships.RelationshipCog(bot)
+        system = await cog.registry.get(GUILD_ID)
+        lazy_system = await cog.registry.get(LAZY_GUILD_ID)
+        lazy_system.lazy_rolls = True
+        date = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        names = [f"Персонаж {i}" for i in range(size)]
+        system.add_characters(names, AUTHOR_ID, date)
+        lazy_system.add_characters(names, AUTHOR_ID, date)
+
+        def command(cmd, guild_id=GUILD_ID, **kwargs):
+            return lambda: cmd.callback(cog, FakeContext(guild_id), **kwargs)
+
+        results = {}
+        steps = [
+            ("бросок", command(cog.roll_relationships)),
+            ("save_data", system.save_data),
+            ("load_data", system.load_data),
+            ("таблица", command(cog.show_relationship_table)),
+            ("таблица (повтор)", command(cog.show_relationship_table)),
+            ("отношения", command(cog.show_detailed_relationships)),
+            ("отношения (повтор)", command(cog.show_detailed_relationships)),
+            ("удалить", command(cog.remove_character, name="Персонаж 0")),
+            ("бросок (lazy)", command(cog.roll_relationships, LAZY_GUILD_ID)),
+            ("таблица (lazy)", command(cog.show_relationship_table, LAZY_GUILD_ID)),
+            ("отношения (lazy)", command(cog.show_detailed_relationships, LAZY_GUILD_ID)),
+        ]
+        for name, step in steps:
+            results[name] = await measure(step, trace_memory)
+
+        await cog.registry.flush_all()
+        for task in asyncio.all_tasks() - {asyncio.current_task()}:
+            task.cancel()
+        return results
+
+
+async def run(sizes):
+    try:
+        import numpy  # noqa: F401
+
+        has_numpy = True
+    except ImportError:
+        has_numpy = False
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": has_numpy,
+        "storage": os.getenv("STORAGE_BACKEND", "json"),
+        "results": [],
+    }
+    for size in sizes:
+        timings = await run_scenario(size, trace_memory=False)
+        memory = await run_scenario(size, trace_memory=True)
+        for name, (seconds, _) in timings.items():
+            report["results"].append(
+                {
+                    "characters": size,
+                    "command": name,
+                    "seconds": round(seconds, 6),
+                    "peak_bytes": memory[name][1],
+                }
+            )
+        print(f"✅ {size} персонажей: готово", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк команд RelationshipCog")
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--output", help="Файл для JSON отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    # Отладочный вывод бота не должен смешиваться с JSON отчётом
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(sizes))
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Нагрузочный прогон всего бота с локальной заменой шлюза и HTTP Discord.
+
+В отличие от bench_commands.py, команды проходят полный путь: сообщение
+собирается из полезной нагрузки MESSAGE_CREATE через ConnectionState,
+bot.process_commands разбирает префикс (case_insensitive=True), вызывает
+ког или on_command_error из main.py, а ответы уходят через общий слой
+вывода в поддельный HTTP клиент (ответ через --http-latency мс).
+
+Сообщения приходят пуассоновским потоком с частотой --rate в секунду на
+--guilds серверов по --channels каналов. Смесь команд — MIX (включая
+неизвестные команды, опечатки в именах и команды в верхнем регистре).
+В отчёте — p50/p99 задержки от получения сообщения до отправки ответа по
+командам, задержка цикла событий и объём записи на диск (METRICS). Ответы
+в канал проходят лимит Discord (5 сообщений за 5 секунд, outbox.py), так
+что при многостраничных ответах p99 определяется числом каналов.
+Хранилище и режим броска задаются как обычно: STORAGE_BACKEND, ROLL_MODE.
+
+Запуск:
+  python benchmarks/load_sim.py --guilds 50 --rate 200 --duration 30 --output load.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import discord
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BOT_USER_ID = 100000000000000001
+FIRST_AUTHOR_ID = 200000000000000000
+
+# Команда (для отчёта) → вес в смеси; текст собирает Simulation.content
+MIX = {
+    "таблица": 15,
+    "отношения": 15,
+    "кто_любит": 10,
+    "средние": 10,
+    "взаимная_любовь": 5,
+    "перебросить": 15,
+    "добавить": 5,
+    "удалить": 2,
+    "персонажи": 8,
+    "опечатка": 5,
+    "ВЕРХНИЙ_РЕГИСТР": 5,
+    "неизвестная": 5,
+}
+
+
+def timestamp() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def user_payload(user_id: int, bot: bool = False) -> dict:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id % 10000}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+class FakeDiscord:
+    """Локальная замена шлюза (события) и HTTP API Discord для одного бота"""
+
+    def __init__(self, bot, guilds: int, channels: int, http_latency: float):
+        self.bot = bot
+        self.state = bot._connection
+        self.http_latency = http_latency
+        self.guilds = []
+        self._ids = itertools.count(1)
+        # Статистика поддельного HTTP
+        self.requests = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self._guild_count = guilds
+        self._channel_count = channels
+        self._channel_guilds = {}
+
+    def snowflake(self) -> int:
+        # Снежинка от текущего времени: message.created_at остаётся правдоподобным
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return discord.utils.time_snowflake(now) + next(self._ids) % (1 << 22)
+
+    def install(self):
+        """Подменить HTTP клиент, задать пользователя бота и создать серверы"""
+        self.bot.http.request = self.request
+        self.state.user = discord.ClientUser(state=self.state, data=user_payload(BOT_USER_ID, True))
+        for index in range(self._guild_count):
+            guild_id = 300000000000000000 + index
+            channel_ids = [guild_id * 100 + number for number in range(self._channel_count)]
+            self._channel_guilds.update(dict.fromkeys(channel_ids, guild_id))
+            channels = [
+                {
+                    "id": str(channel_id),
+                    "type": 0,
+                    "name": f"канал-{number}",
+                    "position": number,
+                    "permission_overwrites": [],
+                }
+                for number, channel_id in enumerate(channel_ids)
+            ]
+            guild = self.state._add_guild_from_data(
+                {
+                    "id": str(guild_id),
+                    "name": f"Сервер {index}",
+                    "owner_id": str(FIRST_AUTHOR_ID),
+                    "roles": [
+                        {
+                            "id": str(guild_id),
+                            "name": "@everyone",
+                            "permissions": "0",
+                            "position": 0,
+                            "color": 0,
+                            "hoist": False,
+                            "managed": False,
+                            "mentionable": False,
+                        }
+                    ],
+                    "channels": channels,
+                    "members": [],
+                    "member_count": 2,
+                }
+            )
+            self.guilds.append(guild)
+
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        """Ответ «Discord» через http_latency; отправка сообщения возвращает его данные"""
+        self.requests += 1
+        await asyncio.sleep(self.http_latency)
+        if route.method == "POST" and route.path == "/channels/{channel_id}/messages":
+            body = kwargs.get("json") or {}
+            self.messages_sent += 1
+            self.bytes_sent += len(json.dumps(body, ensure_ascii=False))
+            return self.message_payload(
+                route.channel_id,
+                self._channel_guilds.get(int(route.channel_id)),
+                BOT_USER_ID,
+                body.get("content") or "",
+                embeds=body.get("embeds") or [],
+                bot=True,
+            )
+        return {}
+
+    def message_payload(self, channel_id, guild_id, author_id, content, embeds=(), bot=False):
+        payload = {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "author": user_payload(author_id, bot),
+            "content": content,
+            "timestamp": timestamp(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": list(embeds),
+            "pinned": False,
+            "type": 0,
+        }
+        if guild_id is not None:
+            payload["guild_id"] = str(guild_id)
+            payload["member"] = {"roles": [], "joined_at": timestamp(), "deaf": False, "mute": False}
+        return payload
+
+    def message(self, channel, author_id: int, content: str):
+        """Сообщение пользователя, как его собрал бы шлюз из MESSAGE_CREATE"""
+        data = self.message_payload(channel.id, channel.guild.id, author_id, content)
+        return discord.Message(state=self.state, channel=channel, data=data)
+
+
+class Simulation:
+    """Поток команд на серверы и сбор задержек"""
+
+    def __init__(self, fake: FakeDiscord, characters: int, authors: int, seed: int):
+        self.fake = fake
+        self.characters = characters
+        self.authors = [FIRST_AUTHOR_ID + number for number in range(authors)]
+        self.random = random.Random(seed)
+        self.names = {guild.id: [f"Персонаж {i}" for i in range(characters)] for guild in fake.guilds}
+        # Задержки по командам, секунды (точные квантили, без корзин)
+        self.latency = {name: [] for name in MIX}
+        self.errors = 0
+
+    def content(self, kind: str, guild_id: int) -> str:
+        names = self.names[guild_id]
+        pick = self.random.choice
+        if kind == "отношения":
+            return f"!отношения {pick(names)}" if names else "!отношения"
+        if kind == "кто_любит":
+            return f"!кто_любит {pick(names)}" if names else "!кто_любит Никто"
+        if kind == "перебросить":
+            if len(names) < 2:
+                return "!перебросить А Б"
+            first, second = self.random.sample(names, 2)
+            return f'!перебросить "{first}" "{second}"'
+        if kind == "добавить":
+            name = f"Новый {self.random.getrandbits(32):08x}"
+            names.append(name)
+            return f"!добавить {name}"
+        if kind == "удалить":
+            if not names:
+                return "!удалить Никто"
+            return f"!удалить {names.pop(self.random.randrange(len(names)))}"
+        if kind == "опечатка":
+            name = pick(names) if names else "Персонаж"
+            return f"!отношения {name[:-1]}ж"
+        if kind == "ВЕРХНИЙ_РЕГИСТР":
+            return "!ТАБЛИЦА"
+        if kind == "неизвестная":
+            return "!таблицу"
+        return f"!{kind}"
+
+    async def send(self, channel, content: str, kind=None):
+        """Доставить сообщение боту и дождаться обработки (включая ответы)"""
+        message = self.fake.message(channel, self.random.choice(self.authors), content)
+        started = time.perf_counter()
+        try:
+            await self.fake.bot.process_commands(message)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ {content!r}: {e}")
+        if kind is not None:
+            self.latency[kind].append(time.perf_counter() - started)
+
+    async def prepare(self):
+        """Персонажи и бросок на каждом сервере (не входит в замеры)"""
+        for guild in self.fake.guilds:
+            channel = guild.text_channels[0]
+            names = self.names[guild.id]
+            if names:
+                await self.send(channel, "!добавить_много " + ", ".join(names))
+                await self.send(channel, "!бросок")
+
+    async def run(self, rate: float, duration: float):
+        kinds, weights = list(MIX), list(MIX.values())
+        tasks = set()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        next_at = loop.time()
+        while next_at < deadline:
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            guild = self.random.choice(self.fake.guilds)
+            channel = self.random.choice(guild.text_channels)
+            kind = self.random.choices(kinds, weights)[0]
+            task = loop.create_task(self.send(channel, self.content(kind, guild.id), kind))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += self.random.expovariate(rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def summary(samples) -> dict:
+    """Количество, p50, p99 и максимум задержек (мс)"""
+    samples = sorted(samples)
+
+    def quantile(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+
+    return {
+        "count": len(samples),
+        "p50_ms": quantile(0.5) if samples else 0.0,
+        "p99_ms": quantile(0.99) if samples else 0.0,
+        "max_ms": round(samples[-1] * 1000, 2) if samples else 0.0,
+    }
+
+
+def histogram_summary(histogram) -> dict:
+    """То же по гистограмме METRICS (квантили — по границам корзин)"""
+    return {
+        "count": histogram.count,
+        "p50_ms": round(histogram.quantile(0.5) * 1000, 2),
+        "p99_ms": round(histogram.quantile(0.99) * 1000, 2),
+        "max_ms": round(histogram.max * 1000, 2),
+    }
+
+
+async def simulate(args) -> dict:
+    import main
+    from metrics import METRICS
+    from outbox import OUTBOX
+
+    bot = main.bot
+    # Асинхронные объекты клиента привязываются к циклу, как при bot.start()
+    await bot._async_setup_hook()
+    fake = FakeDiscord(bot, args.guilds, args.channels, args.http_latency / 1000)
+    fake.install()
+    await bot.setup_hook()
+
+    simulation = Simulation(fake, args.characters, args.authors, args.seed)
+    await simulation.prepare()
+    # Запись подготовленных данных не должна попасть в замер
+    await bot.get_cog("RelationshipCog").registry.flush_all()
+    saved_before = METRICS.io_bytes.get("save", 0)
+    saves_before = METRICS.io["save"].count if "save" in METRICS.io else 0
+
+    started = time.perf_counter()
+    await simulation.run(args.rate, args.duration)
+    elapsed = time.perf_counter() - started
+    # Изменения из очередей и отложенного сохранения — тоже нагрузка на диск
+    await bot.close()
+
+    total = [seconds for samples in simulation.latency.values() for seconds in samples]
+    saves = METRICS.io.get("save")
+    return {
+        "python": platform.python_version(),
+        "storage": os.getenv("STORAGE_BACKEND", "json"),
+        "roll_mode": os.getenv("ROLL_MODE", "eager"),
+        "config": {
+            "guilds": args.guilds,
+            "channels": args.channels,
+            "characters": args.characters,
+            "rate": args.rate,
+            "duration": args.duration,
+            "http_latency_ms": args.http_latency,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "commands": len(total),
+        "throughput_per_second": round(len(total) / elapsed, 1) if elapsed else None,
+        "latency": summary(total),
+        "latency_by_command": {
+            kind: summary(samples) for kind, samples in simulation.latency.items() if samples
+        },
+        "loop_lag": histogram_summary(METRICS.loop_lag),
+        "disk": {
+            "saves": (saves.count if saves else 0) - saves_before,
+            "bytes_written": METRICS.io_bytes.get("save", 0) - saved_before,
+        },
+        "http": {
+            "requests": fake.requests,
+            "messages": fake.messages_sent,
+            "payload_bytes": fake.bytes_sent,
+            "retried_429": OUTBOX.retried,
+            "notices_suppressed": OUTBOX.suppressed,
+        },
+        "errors": simulation.errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота без сети")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=3, help="Каналов на сервер")
+    parser.add_argument("--characters", type=int, default=30, help="Персонажей на сервер")
+    parser.add_argument("--authors", type=int, default=50, help="Разных пользователей")
+    parser.add_argument("--rate", type=float, default=50.0, help="Сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="Секунд нагрузки")
+    parser.add_argument("--http-latency", type=float, default=50.0, help="Задержка HTTP, мс")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Каталог данных (по умолчанию временный)")
+    parser.add_argument("--output", help="Файл для JSON отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.environ["DATA_DIR"] = data_dir
+        # Предзагрузка и эндпоинт метрик не нужны: серверы создаёт симуляция
+        os.environ["PRELOAD_GUILDS"] = "0"
+        os.environ["METRICS_PORT"] = ""
+        # Отладочный вывод бота не должен смешиваться с JSON отчётом
+        with contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(simulate(args))
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
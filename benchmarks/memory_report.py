@@ -0,0 +1,103 @@
+"""Отчёт о памяти на одно отношение: старый формат и компактные записи.
+
+«До» — словарь relationships.json в том виде, в котором его держал бот:
+ключ str((from, to)) и словарь с описанием, id и датой в каждой записи.
+«После» — RelationshipGraph из тех же данных (записи со __slots__, общие
+броски, даты как int, индексы и агрегаты аналитики включены).
+
+Запуск:
+  python benchmarks/memory_report.py --sizes 50,200 --output memory.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+AUTHOR_IDS = [303846448565321729, 412345678901234567, 598765432109876543]
+
+
+def legacy_json(size: int) -> str:
+    """relationships.json для size персонажей: несколько бросков и перебросы"""
+    from Relationship_System import RELATIONSHIP_DESCRIPTIONS
+
+    names = [f"Персонаж {i}" for i in range(size)]
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    dates = [(start + datetime.timedelta(minutes=i)).isoformat() for i in range(5)]
+    relationships = {}
+    for from_char in names:
+        for to_char in names:
+            if from_char == to_char:
+                continue
+            value = random.randint(1, 10)
+            data = {
+                "value": value,
+                "description": RELATIONSHIP_DESCRIPTIONS[value],
+                "rolled_by": random.choice(AUTHOR_IDS),
+                "roll_date": random.choice(dates),
+            }
+            if random.random() < 0.1:
+                data["rerolled_by"] = random.choice(AUTHOR_IDS)
+                data["reroll_date"] = (
+                    start + datetime.timedelta(seconds=random.randint(0, 10**6))
+                ).isoformat()
+            relationships[str((from_char, to_char))] = data
+    return json.dumps(relationships, ensure_ascii=False)
+
+
+def traced(build):
+    """Память (байт), занятая результатом build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, current
+
+
+def report(size: int) -> dict:
+    from Relationship_System import RelationshipGraph
+
+    payload = legacy_json(size)
+    legacy, before = traced(lambda: json.loads(payload))
+    graph, after = traced(lambda: RelationshipGraph.from_json(legacy))
+    # Вывод в JSON не меняется
+    assert graph.to_json() == legacy
+    count = len(graph)
+    return {
+        "characters": size,
+        "relationships": count,
+        "before_bytes_per_relationship": round(before / count, 1),
+        "after_bytes_per_relationship": round(after / count, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на одно отношение")
+    parser.add_argument("--sizes", default="50,200")
+    parser.add_argument("--output", help="Файл для JSON отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    with contextlib.redirect_stdout(sys.stderr):
+        results = [report(size) for size in sizes]
+    payload = json.dumps({"results": results}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Разбор и подготовка массовых операций: списки имён, импорт и экспорт.
+
+Файлы импорта:
+  JSON — {"characters": {...}, "relationships": {"('A', 'B')": {"value": 7, ...}}}
+         (тот же формат, что и у !экспорт json)
+  CSV  — characters.csv со столбцом name и/или relationships.csv со столбцами
+         from, to, value
+"""
+
+import csv
+import io
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from storage import format_pair_key, parse_pair_key
+
+Pair = Tuple[str, str]
+
+# Разделители имён в массовых командах: перевод строки, запятая, точка с запятой
+NAME_SEPARATORS = re.compile(r"[\n,;]+")
+MAX_IMPORT_BYTES = 8 * 1024 * 1024
+
+
+class ImportData:
+    """Проверенные данные импорта"""
+
+    def __init__(self):
+        self.characters: List[str] = []
+        self.relationships: Dict[Pair, dict] = {}
+        self.errors: List[str] = []
+
+
+def split_names(text: str) -> List[str]:
+    """Имена из текста команды без пустых и повторов (порядок сохраняется)"""
+    names = []
+    seen = set()
+    for name in NAME_SEPARATORS.split(text):
+        name = name.strip()
+        if name and name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def _check_value(value, where: str, errors: List[str]) -> Optional[int]:
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        errors.append(f"{where}: значение `{value}` не число")
+        return None
+    if not 1 <= value <= 10:
+        errors.append(f"{where}: значение {value} вне диапазона 1–10")
+        return None
+    return value
+
+
+def _add_relationship(
+    result: ImportData, from_char, to_char, data: dict, where: str
+):
+    if not isinstance(from_char, str) or not isinstance(to_char, str):
+        result.errors.append(f"{where}: некорректные имена")
+        return
+    from_char, to_char = from_char.strip(), to_char.strip()
+    if not from_char or not to_char:
+        result.errors.append(f"{where}: пустое имя")
+        return
+    if from_char == to_char:
+        result.errors.append(f"{where}: отношение к себе `{from_char}`")
+        return
+    value = _check_value(data.get("value"), where, result.errors)
+    if value is not None:
+        result.relationships[(from_char, to_char)] = dict(data, value=value)
+
+
+def parse_json(payload: bytes, result: ImportData):
+    try:
+        raw = json.loads(payload.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        result.errors.append(f"JSON: {e}")
+        return
+    if not isinstance(raw, dict):
+        result.errors.append("JSON: ожидается объект с characters/relationships")
+        return
+
+    characters = raw.get("characters", {})
+    # Допускаем как словарь из экспорта, так и простой список имён
+    if isinstance(characters, dict):
+        names = list(characters)
+    elif isinstance(characters, list):
+        names = characters
+    else:
+        result.errors.append("JSON: characters должен быть объектом или списком")
+        names = []
+    for name in names:
+        if isinstance(name, str) and name.strip():
+            result.characters.append(name.strip())
+        else:
+            result.errors.append(f"JSON: некорректное имя персонажа {name!r}")
+
+    relationships = raw.get("relationships", {})
+    if not isinstance(relationships, dict):
+        result.errors.append("JSON: relationships должен быть объектом")
+        return
+    for rel_key, data in relationships.items():
+        pair = parse_pair_key(rel_key)
+        if pair is None or not isinstance(data, dict):
+            result.errors.append(f"JSON: некорректное отношение {rel_key!r}")
+            continue
+        _add_relationship(result, pair[0], pair[1], data, f"JSON {rel_key}")
+
+
+def parse_csv(payload: bytes, result: ImportData, filename: str):
+    try:
+        reader = csv.DictReader(io.StringIO(payload.decode("utf-8-sig")))
+        rows = list(reader)
+    except (UnicodeDecodeError, csv.Error) as e:
+        result.errors.append(f"{filename}: {e}")
+        return
+    fields = set(reader.fieldnames or ())
+    if {"from", "to", "value"} <= fields:
+        for line, row in enumerate(rows, 2):
+            where = f"{filename}:{line}"
+            data = {"value": row["value"]}
+            # Метаданные из !экспорт csv переносятся, если есть
+            for key in ("rolled_by", "roll_date", "rerolled_by", "reroll_date"):
+                if row.get(key):
+                    data[key] = row[key]
+            for key in ("rolled_by", "rerolled_by"):
+                if key in data:
+                    try:
+                        data[key] = int(data[key])
+                    except ValueError:
+                        result.errors.append(f"{where}: {key} не число")
+            _add_relationship(result, row["from"], row["to"], data, where)
+    elif "name" in fields:
+        for line, row in enumerate(rows, 2):
+            name = (row["name"] or "").strip()
+            if name:
+                result.characters.append(name)
+            else:
+                result.errors.append(f"{filename}:{line}: пустое имя")
+    else:
+        result.errors.append(
+            f"{filename}: нужны столбцы `name` или `from,to,value`"
+        )
+
+
+def parse_import(files: List[Tuple[str, bytes]], known_characters) -> ImportData:
+    """Разобрать и проверить все файлы за один проход"""
+    result = ImportData()
+    for filename, payload in files:
+        if filename.lower().endswith(".json"):
+            parse_json(payload, result)
+        elif filename.lower().endswith(".csv"):
+            parse_csv(payload, result, filename)
+        else:
+            result.errors.append(f"{filename}: поддерживаются только .json и .csv")
+
+    result.characters = list(dict.fromkeys(result.characters))
+    # Отношения должны ссылаться на существующих или импортируемых персонажей
+    available = set(known_characters) | set(result.characters)
+    for from_char, to_char in result.relationships:
+        for name in (from_char, to_char):
+            if name not in available:
+                result.errors.append(f"Персонаж `{name}` из отношений не найден")
+                available.add(name)  # Сообщаем о каждом имени один раз
+    return result
+
+
+def export_json(characters: dict, items) -> bytes:
+    """Экспорт в JSON (items — ((from, to), Relationship))"""
+    data = {
+        "characters": characters,
+        "relationships": {
+            format_pair_key(from_char, to_char): rel.to_dict()
+            for (from_char, to_char), rel in items
+        },
+    }
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def export_csv(characters: dict, items) -> Tuple[bytes, bytes]:
+    """Экспорт в CSV: (characters.csv, relationships.csv)"""
+    chars_out = io.StringIO()
+    writer = csv.writer(chars_out)
+    writer.writerow(["name", "added_by", "added_date"])
+    for name, data in characters.items():
+        writer.writerow([name, data.get("added_by"), data.get("added_date")])
+
+    rels_out = io.StringIO()
+    writer = csv.writer(rels_out)
+    writer.writerow(
+        ["from", "to", "value", "description", "rolled_by", "roll_date", "rerolled_by", "reroll_date"]
+    )
+    for (from_char, to_char), rel in items:
+        data = rel.to_dict()
+        writer.writerow(
+            [
+                from_char,
+                to_char,
+                data["value"],
+                data["description"],
+                data.get("rolled_by"),
+                data.get("roll_date"),
+                data.get("rerolled_by"),
+                data.get("reroll_date"),
+            ]
+        )
+    return chars_out.getvalue().encode("utf-8"), rels_out.getvalue().encode("utf-8")
@@ -1,32 +1,46 @@
 # Module-level debug: Confirm file is loaded
 print("🔍 Модуль cogs.relationships загружен (файл найден)!")
 
+import asyncio
+import io
 import discord
+from discord import app_commands
 from discord.ext import commands
-import json
-import os
-import random
-import ast  # Для безопасного парсинга rel_key
-from typing import Dict, List
+from typing import List
 import traceback  # For error traces
 
-# Lazy import: Import RelationshipSystem only when needed
-RelationshipSystem = None
+import bulk
+from rendering import Renderer, paginate_lines, send_embeds, set_page_footers
+
+# Lazy import: Import GuildRegistry only when needed
+GuildRegistry = None
+RELATIONSHIP_DESCRIPTIONS = {}
+# Лимит Discord на имя и значение варианта автодополнения
+CHOICE_VALUE_LIMIT = 100
 
 
 class RelationshipCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._handed_over = False
         try:
-            global RelationshipSystem
-            if RelationshipSystem is None:
-                from Relationship_System import RelationshipSystem
-
-                print("✅ Импорт RelationshipSystem успешен в __init__!")
-            self.system = RelationshipSystem()
+            global GuildRegistry, RELATIONSHIP_DESCRIPTIONS
+            if GuildRegistry is None:
+                from Relationship_System import GuildRegistry, RELATIONSHIP_DESCRIPTIONS
+
+                print("✅ Импорт GuildRegistry успешен в __init__!")
+            # Живое состояние от предыдущего экземпляра (горячая перезагрузка)
+            registry = getattr(bot, "relationship_state", None)
+            if registry is not None:
+                del bot.relationship_state
+                self.registry = registry
+                print(f"🔁 Принято состояние: {len(registry)} серверов в памяти")
+            else:
+                # Данные каждого сервера загружаются лениво при первой команде
+                self.registry = GuildRegistry()
             print(f"✅ RelationshipCog инициализирован для {bot.user}!")
         except ImportError as e:
-            print(f"❌ ImportError RelationshipSystem в __init__: {e}")
+            print(f"❌ ImportError GuildRegistry в __init__: {e}")
             traceback.print_exc()
 
             # Fallback: Dummy system for testing (remove in production)
@@ -38,10 +52,32 @@ class RelationshipCog(commands.Cog):
                 def save_data(self):
                     pass
 
+                def schedule_save(self):
+                    pass
+
+                async def submit(self, mutation, *args):
+                    return mutation(*args)
+
                 def load_data(self):
                     pass
 
-            self.system = DummySystem()
+            class DummyRegistry:
+                def __init__(self):
+                    self.systems = {}
+
+                async def get(self, guild_id):
+                    return self.systems.setdefault(guild_id, DummySystem())
+
+                def peek(self, guild_id):
+                    return self.systems.setdefault(guild_id, DummySystem())
+
+                def prefetch(self, guild_id):
+                    pass
+
+                async def flush_all(self):
+                    pass
+
+            self.registry = DummyRegistry()
             print(
                 "⚠️ Используется dummy RelationshipSystem (команды могут работать частично)"
             )
@@ -50,41 +86,97 @@ class RelationshipCog(commands.Cog):
             traceback.print_exc()
             raise  # Re-raise to prevent partial load
 
-        self.relationship_descriptions = {
-            1: "🔴 Вражда",
-            2: "🔴 Конфликт",
-            3: "🟡 Напряжение",
-            4: "🟡 Нейтрально",
-            5: "🟢 Дружелюбие",
-            6: "🟢 Симпатия",
-            7: "🔵 Дружба",
-            8: "🔵 Близость",
-            9: "💖 Любовь",
-            10: "💖 Душа",
-        }
+        self.relationship_descriptions = RELATIONSHIP_DESCRIPTIONS
+        self.renderer = Renderer(self.relationship_descriptions)
 
         # Debug: List commands after init
         print(
             "📝 Команды в RelationshipCog:", [cmd.name for cmd in self.get_commands()]
         )
 
-    @commands.command(name="добавить")
+    def hand_over(self):
+        """Передать данные серверов следующему экземпляру кога.
+
+        Вызывается перед reload_extension: новый экземпляр забирает реестр с
+        отложенными изменениями как есть, без сохранения и повторного чтения.
+        """
+        self.bot.relationship_state = self.registry
+        self._handed_over = True
+
+    async def cog_unload(self):
+        """Сохранить отложенные изменения при выгрузке кога (в т.ч. при выключении бота)"""
+        if self._handed_over:
+            print("🔁 Данные отношений переданы новому экземпляру кога")
+            return
+        await self.registry.flush_all()
+        print("💾 Данные отношений сохранены перед выгрузкой кога")
+
+    def cog_check(self, ctx):
+        """Данные привязаны к серверу, поэтому команды работают только на серверах"""
+        return ctx.guild is not None
+
+    async def defer(self, ctx):
+        """Отложить ответ слэш-команды: на первый ответ Discord даёт три секунды"""
+        interaction = getattr(ctx, "interaction", None)
+        if interaction is not None and not interaction.response.is_done():
+            await ctx.defer()
+
+    async def get_system(self, ctx):
+        """Система отношений сервера, на котором вызвана команда"""
+        if self.registry.peek(ctx.guild.id) is None:
+            # Загрузка данных сервера может занять дольше срока ответа
+            await self.defer(ctx)
+        return await self.registry.get(ctx.guild.id)
+
+    async def character_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        """Автодополнение имён персонажей в слэш-командах"""
+        if interaction.guild_id is None:
+            return []
+        system = self.registry.peek(interaction.guild_id)
+        if system is None:
+            # Подсказки не ждут загрузки сервера: она идёт в фоне для следующих
+            self.registry.prefetch(interaction.guild_id)
+            return []
+        if not hasattr(system, "name_index"):
+            return []
+        # Обрезанное значение не совпало бы с именем — длинные имена не подсказываются
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in system.name_index.complete(current, 25)
+            if len(name) <= CHOICE_VALUE_LIMIT
+        ]
+
+    def not_found(self, system, name: str) -> str:
+        """Сообщение «персонаж не найден» с подсказкой похожих имён"""
+        message = f"❌ Персонаж `{name}` не найден!"
+        if hasattr(system, "name_index"):
+            similar = system.name_index.lookup(name) or system.name_index.fuzzy(name, 3)
+            if similar:
+                message += " Возможно: " + ", ".join(f"`{other}`" for other in similar)
+        return message
+
+    @commands.hybrid_command(name="добавить")
+    @app_commands.describe(name="Имя нового персонажа")
     async def add_character(self, ctx, *, name: str):
         """Добавить нового персонажа"""
+        system = await self.get_system(ctx)
         name = name.strip()  # Удаляем лишние пробелы
         if not name:
             await ctx.send("❌ Имя не может быть пустым!")
             return
-        if name in self.system.characters:
+        # Проверка и добавление выполняются вместе в очереди сервера
+        added = await system.submit(
+            system.add_characters,
+            [name],
+            ctx.author.id,
+            ctx.message.created_at.isoformat(),
+        )
+        if not added:
             await ctx.send(f"❌ Персонаж `{name}` уже существует!")
             return
 
-        self.system.characters[name] = {
-            "added_by": ctx.author.id,
-            "added_date": ctx.message.created_at.isoformat(),
-        }
-        self.system.save_data()
-
         embed = discord.Embed(
             title="✅ Персонаж добавлен",
             description=f"Персонаж `{name}` успешно добавлен!",
@@ -92,78 +184,188 @@ class RelationshipCog(commands.Cog):
         )
         await ctx.send(embed=embed)
 
-    @commands.command(name="удалить")
+    @commands.hybrid_command(name="удалить")
+    @app_commands.describe(name="Имя персонажа")
     async def remove_character(self, ctx, *, name: str):
         """Удалить персонажа"""
+        system = await self.get_system(ctx)
         name = name.strip()
         if not name:
             await ctx.send("❌ Имя не может быть пустым!")
             return
-        if name not in self.system.characters:
-            await ctx.send(f"❌ Персонаж `{name}` не найден!")
+        # Удаляем все исходящие (name → other) и входящие (other → name) отношения
+        removed, _ = await system.submit(
+            system.remove_characters, [name], ctx.author.id
+        )
+        if not removed:
+            await ctx.send(self.not_found(system, name))
             return
 
-        del self.system.characters[name]
-        # Удаляем все исходящие (name → other) и входящие (other → name) отношения
-        to_remove = []
-        for rel_key in list(self.system.relationships):
-            try:
-                chars = ast.literal_eval(rel_key)
-                if name in chars:  # Either direction
-                    to_remove.append(rel_key)
-            except (ValueError, SyntaxError):
-                continue
-        for rel_key in to_remove:
-            del self.system.relationships[rel_key]
-
-        self.system.save_data()
         await ctx.send(f"✅ Персонаж `{name}` и все его отношения удалены!")
 
-    @commands.command(name="персонажи")
-    async def list_characters(self, ctx):
-        """Показать список всех персонажей"""
-        if not self.system.characters:
-            await ctx.send("❌ Пока нет добавленных персонажей!")
+    @commands.hybrid_command(name="добавить_много")
+    @app_commands.describe(names="Имена через запятую")
+    async def add_characters(self, ctx, *, names: str):
+        """Добавить нескольких персонажей (через запятую или с новой строки)"""
+        system = await self.get_system(ctx)
+        names = bulk.split_names(names)
+        if not names:
+            await ctx.send("❌ Не указано ни одного имени!")
             return
 
-        characters = list(self.system.characters.keys())
+        # Вся пачка — одно изменение в очереди сервера и одно сохранение
+        added = await system.submit(
+            system.add_characters,
+            names,
+            ctx.author.id,
+            ctx.message.created_at.isoformat(),
+        )
+        existing = [name for name in names if name not in added]
+
         embed = discord.Embed(
-            title="👥 Список персонажей",
-            description=f"Всего персонажей: {len(characters)}\n\n"
-            + "\n".join([f"• {char}" for char in sorted(characters)]),
-            color=0x9370DB,
+            title="✅ Персонажи добавлены",
+            description=f"Добавлено: {len(added)}, уже существовали: {len(existing)}",
+            color=0x00FF00 if added else 0xFF0000,
         )
+        if added:
+            embed.add_field(
+                name="Добавлены", value=", ".join(added)[:1024], inline=False
+            )
+        if existing:
+            embed.add_field(
+                name="Уже существуют", value=", ".join(existing)[:1024], inline=False
+            )
         await ctx.send(embed=embed)
 
-    @commands.command(name="бросок")
-    async def roll_relationships(self, ctx):
-        """Бросить кубы для определения отношений (теперь направленные)"""
-        if len(self.system.characters) < 2:
-            await ctx.send("❌ Нужно как минимум 2 персонажа!")
+    @commands.hybrid_command(name="удалить_много")
+    @app_commands.describe(names="Имена через запятую")
+    async def remove_characters(self, ctx, *, names: str):
+        """Удалить нескольких персонажей (через запятую или с новой строки)"""
+        system = await self.get_system(ctx)
+        names = bulk.split_names(names)
+        if not names:
+            await ctx.send("❌ Не указано ни одного имени!")
+            return
+
+        removed, relationships_removed = await system.submit(
+            system.remove_characters, names, ctx.author.id
+        )
+        missing = [name for name in names if name not in removed]
+
+        description = (
+            f"Удалено персонажей: {len(removed)}, отношений: {relationships_removed}"
+        )
+        if missing:
+            description += f"\nНе найдены: {', '.join(missing)}"
+        await ctx.send(f"{'✅' if removed else '❌'} {description}"[:2000])
+
+    @commands.command(name="импорт")
+    async def import_data(self, ctx):
+        """Импорт персонажей и отношений из прикрепленных JSON/CSV файлов"""
+        system = await self.get_system(ctx)
+        attachments = ctx.message.attachments
+        if not attachments:
+            await ctx.send(
+                "❌ Прикрепите файл JSON (как из `!экспорт`) или CSV "
+                "(`name` либо `from,to,value`)!"
+            )
+            return
+        if sum(attachment.size for attachment in attachments) > bulk.MAX_IMPORT_BYTES:
+            await ctx.send("❌ Файлы слишком большие для импорта!")
             return
 
-        characters = list(self.system.characters.keys())
-        relationships_created = 0
+        files = [
+            (attachment.filename, await attachment.read()) for attachment in attachments
+        ]
+        # Разбор и проверка всех файлов за один проход вне цикла событий
+        result = await asyncio.to_thread(
+            bulk.parse_import, files, set(system.characters)
+        )
+
+        # Все изменения применяются разом: одно изменение в очереди и один ответ
+        applied = None
+        if not result.errors:
+            applied = await system.submit(
+                system.apply_import,
+                result,
+                ctx.author.id,
+                ctx.message.created_at.isoformat(),
+            )
+        if applied is None:
+            errors = "\n".join(f"• {error}" for error in result.errors[:20])
+            if len(result.errors) > 20:
+                errors += f"\n… и еще {len(result.errors) - 20}"
+            await ctx.send(f"❌ Импорт отменен, ошибок: {len(result.errors)}\n{errors}"[:2000])
+            return
+        added, relationships = applied
 
-        for char1 in characters:
-            for char2 in characters:
-                if char1 == char2:  # No self-relation
-                    continue
+        embed = discord.Embed(
+            title="📥 Импорт завершен",
+            description=f"Новых персонажей: {added}\nОтношений импортировано: {relationships}",
+            color=0x00FF00,
+        )
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="экспорт")
+    @app_commands.describe(file_format="Формат файла")
+    @app_commands.choices(
+        file_format=[
+            app_commands.Choice(name="json", value="json"),
+            app_commands.Choice(name="csv", value="csv"),
+        ]
+    )
+    async def export_data(self, ctx, file_format: str = "json"):
+        """Экспорт персонажей и отношений в файл (json или csv)"""
+        await self.defer(ctx)
+        system = await self.get_system(ctx)
+        file_format = file_format.strip().lower()
+        if file_format not in ("json", "csv"):
+            await ctx.send("❌ Формат экспорта: `json` или `csv`")
+            return
+
+        # Снимок берется в цикле событий, сериализация — в рабочем потоке
+        characters = dict(system.characters)
+        items = list(system.relationships.items())
+        if file_format == "json":
+            payload = await asyncio.to_thread(bulk.export_json, characters, items)
+            files = [discord.File(io.BytesIO(payload), filename="relationships_export.json")]
+        else:
+            chars_csv, rels_csv = await asyncio.to_thread(
+                bulk.export_csv, characters, items
+            )
+            files = [
+                discord.File(io.BytesIO(chars_csv), filename="characters.csv"),
+                discord.File(io.BytesIO(rels_csv), filename="relationships.csv"),
+            ]
+        await ctx.send(
+            f"📤 Экспорт: {len(characters)} персонажей, {len(items)} отношений",
+            files=files,
+        )
 
-                rel_key = str((char1, char2))  # Directed: (from, to), no sorting
+    @commands.hybrid_command(name="персонажи")
+    async def list_characters(self, ctx):
+        """Показать список всех персонажей"""
+        system = await self.get_system(ctx)
+        if not system.characters:
+            await ctx.send("❌ Пока нет добавленных персонажей!")
+            return
 
-                if rel_key not in self.system.relationships:
-                    roll = random.randint(1, 10)
+        # Длинный список делится на страницы (до 10 embed в сообщении)
+        await send_embeds(ctx, self.renderer.characters(system))
 
-                    self.system.relationships[rel_key] = {
-                        "value": roll,
-                        "description": self.relationship_descriptions[roll],
-                        "rolled_by": ctx.author.id,
-                        "roll_date": ctx.message.created_at.isoformat(),
-                    }
-                    relationships_created += 1
+    @commands.hybrid_command(name="бросок")
+    async def roll_relationships(self, ctx):
+        """Бросить кубы для определения отношений (теперь направленные)"""
+        await self.defer(ctx)
+        system = await self.get_system(ctx)
+        if len(system.characters) < 2:
+            await ctx.send("❌ Нужно как минимум 2 персонажа!")
+            return
 
-        self.system.save_data()
+        # Все недостающие направленные отношения (from, to) одним броском
+        relationships_created = await system.submit(
+            system.roll_missing, ctx.author.id, ctx.message.created_at.isoformat()
+        )
 
         embed = discord.Embed(
             title="🎲 Отношения определены!",
@@ -172,113 +374,122 @@ class RelationshipCog(commands.Cog):
         )
         await ctx.send(embed=embed)
 
-    @commands.command(name="таблица")
+    @commands.hybrid_command(name="таблица")
     async def show_relationship_table(self, ctx):
         """Показать таблицу отношений (направленная матрица)"""
-        if not self.system.relationships:
+        await self.defer(ctx)
+        system = await self.get_system(ctx)
+        if not system.relationships:
             await ctx.send("❌ Отношения еще не определены! Используйте `!бросок`")
             return
 
-        characters = sorted(self.system.characters.keys())
-
-        # Создаем таблицу: строки = from, столбцы = to
-        table = "```\n"
-        table += " " * 15
-        for char in characters:
-            table += f"{char[:8]:>8} "
-        table += "\n" + "-" * (15 + 9 * len(characters)) + "\n"
-
-        for char1 in characters:  # From
-            table += f"{char1[:14]:<14} "
-            for char2 in characters:  # To
-                if char1 == char2:
-                    table += "    —    "
-                else:
-                    rel_key = str((char1, char2))  # Directed from char1 to char2
-                    if rel_key in self.system.relationships:
-                        rel = self.system.relationships[rel_key]
-                        table += f"    {rel['value']}    "
-                    else:
-                        table += "    ?    "
-            table += "\n"
-        table += "```"
-
-        embed = discord.Embed(
-            title="📊 Таблица отношений (направленная)",
-            description=table,
-            color=0xFFD700,
-        )
-
-        # Легенда
-        legend = ""
-        for value, desc in self.relationship_descriptions.items():
-            legend += f"{value}: {desc}\n"
+        # Страницы кэшируются до следующего изменения данных сервера
+        await send_embeds(ctx, self.renderer.table(system))
 
-        embed.add_field(name="🎯 Легенда", value=legend, inline=False)
-        embed.set_footer(text="Строки: отношение ОТ персонажа, Столбцы: К персонажу")
-        await ctx.send(embed=embed)
-
-    @commands.command(name="отношения")
+    @commands.hybrid_command(name="отношения")
+    @app_commands.describe(character_name="Персонаж (по умолчанию — все отношения)")
     async def show_detailed_relationships(self, ctx, *, character_name: str = None):
         """Показать подробные отношения (только исходящие для конкретного персонажа)"""
-        if not self.system.relationships:
+        await self.defer(ctx)
+        system = await self.get_system(ctx)
+        if not system.relationships:
             await ctx.send("❌ Отношения еще не определены!")
             return
 
-        embed = discord.Embed(title="💞 Детальные отношения", color=0xFF69B4)
-
         if character_name:
             character_name = character_name.strip()
-            if character_name not in self.system.characters:
-                await ctx.send(f"❌ Персонаж `{character_name}` не найден!")
+            if character_name not in system.characters:
+                await ctx.send(self.not_found(system, character_name))
                 return
 
-            # Только исходящие отношения от character_name к другим
-            relationships = []
-            other_chars = [c for c in self.system.characters if c != character_name]
-            for other_char in other_chars:
-                rel_key = str((character_name, other_char))  # Directed: from → to
-                if rel_key in self.system.relationships:
-                    rel_data = self.system.relationships[rel_key]
-                    relationships.append((other_char, rel_data))
-                else:
-                    relationships.append((other_char, None))  # No relation yet
-
-            if not any(rel[1] for rel in relationships):
-                embed.description = f"У {character_name} пока нет отношений."
-            else:
-                desc = f"Отношения **{character_name}** → другим:\n\n"
-                for other_char, rel_data in sorted(
-                    relationships,
-                    key=lambda x: (x[1]["value"] if x[1] else 0) if x[1] else (0, x[0]),
-                    reverse=True,
-                ):
-                    if rel_data:
-                        desc += f"**{character_name} → {other_char}**: {rel_data['value']} - {rel_data['description']}\n"
-                    else:
-                        desc += f"**{character_name} → {other_char}**: Нет отношения\n"
-                embed.description = desc
-        else:
-            # Все направленные отношения (from → to)
-            desc = "Все отношения (от → к):\n\n"
-            all_rels = []
-            for rel_key, rel_data in self.system.relationships.items():
-                try:
-                    chars = ast.literal_eval(rel_key)
-                    all_rels.append((chars[0], chars[1], rel_data))
-                except (ValueError, SyntaxError):
-                    continue
-            for from_char, to_char, rel_data in sorted(
-                all_rels, key=lambda x: x[2]["value"], reverse=True
-            ):
-                desc += f"**{from_char} → {to_char}**: {rel_data['value']} - {rel_data['description']}\n"
-            embed.description = desc
+        await send_embeds(ctx, self.renderer.details(system, character_name))
+
+    @commands.hybrid_command(name="кто_любит")
+    @app_commands.describe(character_name="Персонаж")
+    async def show_admirers(self, ctx, *, character_name: str):
+        """Кто относится к персонажу лучше всех"""
+        system = await self.get_system(ctx)
+        character_name = character_name.strip()
+        if character_name not in system.characters:
+            await ctx.send(self.not_found(system, character_name))
+            return
 
+        stats = system.relationships.stats
+        best, admirers = stats.favorite(character_name)
+        if best is None:
+            await ctx.send(f"❌ К `{character_name}` пока нет отношений!")
+            return
+
+        incoming = stats.incoming[character_name]
+        embed = discord.Embed(
+            title=f"💘 Кто любит {character_name} больше всех",
+            description=(
+                f"**{', '.join(admirers)}** → {character_name}: "
+                f"{best} - {self.relationship_descriptions[best]}"
+            )[:4096],
+            color=0xFF69B4,
+        )
+        embed.add_field(
+            name="📊 Входящие отношения",
+            value=(
+                f"Среднее: {incoming.mean:.2f} ({incoming.count} шт.), "
+                f"от {incoming.min} до {incoming.max}"
+            ),
+            inline=False,
+        )
         await ctx.send(embed=embed)
 
-    @commands.command(name="перебросить")
+    @commands.hybrid_command(name="взаимная_любовь")
+    async def show_mutual_love(self, ctx):
+        """Пары персонажей со взаимной любовью"""
+        system = await self.get_system(ctx)
+        relationships = system.relationships
+        pairs = sorted(relationships.stats.mutual_love)
+        if not pairs:
+            await ctx.send("💔 Пар со взаимной любовью пока нет!")
+            return
+
+        lines = [
+            f"**{a} ⇄ {b}**: {relationships.get(a, b).value} / {relationships.get(b, a).value}"
+            for a, b in pairs
+        ]
+        embeds = [
+            discord.Embed(title="💞 Взаимная любовь", description=page, color=0xFF69B4)
+            for page in paginate_lines(lines, f"Всего пар: {len(pairs)}\n\n")
+        ]
+        set_page_footers(embeds)
+        await send_embeds(ctx, embeds)
+
+    @commands.hybrid_command(name="средние")
+    async def show_average_attitudes(self, ctx):
+        """Среднее отношение к каждому персонажу (входящие отношения)"""
+        system = await self.get_system(ctx)
+        stats = system.relationships.stats
+        if not stats.total.count:
+            await ctx.send("❌ Отношения еще не определены!")
+            return
+
+        ranking = sorted(
+            stats.incoming.items(), key=lambda item: item[1].mean, reverse=True
+        )
+        lines = [
+            f"**{name}**: {aggregate.mean:.2f} (от {aggregate.min} до {aggregate.max}, "
+            f"{aggregate.count} шт.)"
+            for name, aggregate in ranking
+        ]
+        header = f"Среднее по всем отношениям: {stats.total.mean:.2f}\n\n"
+        embeds = [
+            discord.Embed(title="⚖️ Среднее отношение к персонажам", description=page, color=0x9370DB)
+            for page in paginate_lines(lines, header)
+        ]
+        set_page_footers(embeds)
+        await send_embeds(ctx, embeds)
+
+    @commands.hybrid_command(name="перебросить")
+    @app_commands.describe(char1="От кого", char2="К кому")
     async def reroll_relationship(self, ctx, char1: str, char2: str):
         """Перебросить отношение от char1 к char2 (с логикой корректировки)"""
+        system = await self.get_system(ctx)
         char1 = char1.strip()
         char2 = char2.strip()
         if not char1 or not char2:
@@ -288,23 +499,101 @@ class RelationshipCog(commands.Cog):
             await ctx.send("❌ Нельзя перебросить отношение к себе!")
             return
 
-        rel_key = str((char1, char2))  # Directed: from char1 to char2
-
-        if rel_key not in self.system.relationships:
+        # Directed: from char1 to char2; логика корректировки — в RollEngine
+        results = await system.submit(
+            system.reroll,
+            [(char1, char2)],
+            ctx.author.id,
+            ctx.message.created_at.isoformat(),
+        )
+        if not results:
             await ctx.send(
                 f"❌ Отношение от `{char1}` к `{char2}` не найдено! Используйте `!бросок` сначала."
             )
             return
 
-        old_data = self.system.relationships[rel_key]
-        old_value = old_data["value"]
+        _, _, old_value, new_roll, final_value = results[0]
+        if final_value > old_value:
+            outcome = "📈 Отношение улучшилось"
+        elif final_value < old_value:
+            outcome = "📉 Отношение ухудшилось"
+        else:
+            outcome = "➖ Отношение не изменилось"
+        embed = discord.Embed(
+            title="🎲 Отношение переброшено",
+            description=(
+                f"**{char1} → {char2}**\n"
+                f"Было: {old_value} - {self.relationship_descriptions[old_value]}\n"
+                f"Бросок: {new_roll}\n"
+                f"Стало: {final_value} - {self.relationship_descriptions[final_value]}\n\n"
+                f"{outcome}"
+            ),
+            color=0x0099FF,
+        )
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="перебросить_все")
+    @app_commands.describe(
+        direction="Какие отношения перебросить", character_name="Персонаж (для всего графа — пусто)"
+    )
+    @app_commands.choices(
+        direction=[
+            app_commands.Choice(name="все", value="все"),
+            app_commands.Choice(name="исходящие", value="исходящие"),
+            app_commands.Choice(name="входящие", value="входящие"),
+        ]
+    )
+    async def reroll_many(self, ctx, direction: str = "все", *, character_name: str = None):
+        """Перебросить все отношения: графа, персонажа, его исходящие или входящие"""
+        await self.defer(ctx)
+        system = await self.get_system(ctx)
+        direction = direction.strip().lower()
+        if direction not in ("все", "исходящие", "входящие"):
+            await ctx.send("❌ Направление: `все`, `исходящие` или `входящие`")
+            return
+        if character_name:
+            character_name = character_name.strip()
+            if character_name not in system.characters:
+                await ctx.send(self.not_found(system, character_name))
+                return
+        elif direction != "все":
+            await ctx.send("❌ Укажите персонажа, например: `!перебросить_все исходящие Имя`")
+            return
+
+        # Пары выбираются в очереди сервера, чтобы видеть актуальный граф
+        results = await system.submit(
+            system.reroll_scope,
+            character_name,
+            direction,
+            ctx.author.id,
+            ctx.message.created_at.isoformat(),
+        )
+        if not results:
+            await ctx.send("❌ Нет отношений для переброса! Используйте `!бросок` сначала.")
+            return
+
+        increased = sum(1 for *_, old, _, new in results if new > old)
+        decreased = sum(1 for *_, old, _, new in results if new < old)
+        scope = f"персонажа `{character_name}` ({direction})" if character_name else "всего графа"
+        embed = discord.Embed(
+            title="🎲 Отношения переброшены",
+            description=(
+                f"Переброшено отношений {scope}: {len(results)}\n"
+                f"📈 Улучшилось: {increased}\n"
+                f"📉 Ухудшилось: {decreased}\n"
+                f"➖ Без изменений: {len(results) - increased - decreased}"
+            ),
+            color=0x0099FF,
+        )
+        await ctx.send(embed=embed)
 
-        new_roll = random.randint(1, 10)
-        # Логика корректировки
-        if new_roll > old_value:
-            final_value = min(10, old_value + 1)  # Увеличиваем на 1, макс 10
-        elif new_roll == 1:
-            final_value = max(1, old_value - 1)  # Уменьшаем на 1, мин 1
+    # Автодополнение имён (префиксы без учета регистра и похожие имена)
+    remove_character.autocomplete("name")(character_autocomplete)
+    show_detailed_relationships.autocomplete("character_name")(character_autocomplete)
+    show_admirers.autocomplete("character_name")(character_autocomplete)
+    reroll_relationship.autocomplete("char1")(character_autocomplete)
+    reroll_relationship.autocomplete("char2")(character_autocomplete)
+    reroll_many.autocomplete("character_name")(character_autocomplete)
 
 
 # Async setup function (required for Discord.py 2.x cog extensions)
@@ -0,0 +1,145 @@
+"""Журнал изменений (append-only) для JSON хранилища.
+
+Каждое изменение — одна компактная JSON строка:
+  {"op": "add", "name": ..., "by": ..., "at": ...}
+  {"op": "remove", "name": ..., "by": ...}
+  {"op": "roll", "by": ..., "at": ..., "names": [...], "cells": [from_no, to_no, value, ...]}
+  {"op": "reroll", "by": ..., "at": ..., "cells": [[from, to, value], ...]}
+  {"op": "lazy_roll", "by": ..., "at": ..., "seed": ..., "names": [...]}
+  {"op": "set", "from": ..., "to": ..., "data": {...}}
+
+При загрузке журнал применяется поверх снимка (characters.json +
+relationships.json). Операции задают итоговые значения, поэтому повторное
+применение журнала к уже включившему его снимку даёт то же состояние — это
+делает безопасным сбой между записью снимка и ротацией журнала.
+"""
+
+import glob
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+Pair = Tuple[str, str]
+
+
+def encode_ops(ops: List[dict]) -> bytes:
+    return "".join(
+        json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n" for op in ops
+    ).encode("utf-8")
+
+
+def apply_op(op: dict, characters: Dict[str, dict], relationships: Dict[Pair, dict]):
+    """Применить операцию журнала к данным в формате JSON"""
+    kind = op["op"]
+    if kind == "add":
+        characters[op["name"]] = {"added_by": op["by"], "added_date": op["at"]}
+    elif kind == "remove":
+        name = op["name"]
+        characters.pop(name, None)
+        for pair in [pair for pair in relationships if name in pair]:
+            del relationships[pair]
+    elif kind == "roll":
+        cells = op["cells"]
+        names = op.get("names")
+        if names is not None:
+            # Ячейки тройками (номер from, номер to, значение) по списку names
+            numbers = iter(cells)
+            cells = [(names[a], names[b], value) for a, b, value in zip(numbers, numbers, numbers)]
+        # Записи одного броска с одинаковым значением совпадают — одна на значение
+        records = {}
+        for from_char, to_char, value in cells:
+            data = records.get(value)
+            if data is None:
+                data = records[value] = {
+                    "value": value,
+                    "rolled_by": op["by"],
+                    "roll_date": op["at"],
+                }
+            relationships[(from_char, to_char)] = data
+    elif kind == "reroll":
+        for from_char, to_char, value in op["cells"]:
+            data = dict(relationships.get((from_char, to_char), {}))
+            data.update(value=value, rerolled_by=op["by"], reroll_date=op["at"])
+            relationships[(from_char, to_char)] = data
+    elif kind == "lazy_roll":
+        for name in op["names"]:
+            if name in characters:
+                characters[name] = dict(
+                    characters[name],
+                    rolled_by=op["by"],
+                    roll_date=op["at"],
+                    roll_seed=op["seed"],
+                )
+    elif kind == "set":
+        relationships[(op["from"], op["to"])] = op["data"]
+    else:
+        raise ValueError(f"неизвестная операция {kind!r}")
+
+
+class Journal:
+    """Файл журнала с ротацией в архивы после сжатия в снимок"""
+
+    def __init__(self, path: str, keep_archives: int = 10):
+        self.path = path
+        self.keep_archives = keep_archives
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.started_at = time.monotonic()
+
+    def sync(self):
+        """Перечитать размер журнала с диска (его мог дописать другой процесс)"""
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def replay(self, characters: Dict[str, dict], relationships: Dict[Pair, dict]) -> int:
+        """Применить журнал к загруженному снимку, вернуть число операций"""
+        if not os.path.exists(self.path):
+            return 0
+        applied = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    apply_op(json.loads(line), characters, relationships)
+                    applied += 1
+                except (ValueError, KeyError, TypeError) as e:
+                    # Недописанная последняя строка после сбоя — ожидаемая ситуация
+                    print(f"⚠️ Пропущена запись журнала {self.path}:{number}: {e}")
+        return applied
+
+    def append(self, ops: List[dict]) -> int:
+        """Дописать операции в журнал, вернуть число записанных байт"""
+        if not ops:
+            return 0
+        payload = encode_ops(ops)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a+b") as f:
+            # Недописанная строка после сбоя не должна склеиться с новой записью
+            if f.seek(0, os.SEEK_END) and not self._ends_with_newline(f):
+                payload = b"\n" + payload
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size += len(payload)
+        return len(payload)
+
+    @staticmethod
+    def _ends_with_newline(f) -> bool:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+    def rotate(self):
+        """Убрать журнал в архив после записи снимка (журнал аудита сохраняется)"""
+        if os.path.exists(self.path):
+            base, ext = os.path.splitext(self.path)
+            os.replace(self.path, f"{base}-{time.time_ns()}{ext}")
+            archives = sorted(glob.glob(f"{glob.escape(base)}-*{ext}"))
+            for old in archives[: max(0, len(archives) - self.keep_archives)]:
+                os.unlink(old)
+        self.size = 0
+        self.started_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.started_at
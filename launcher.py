@@ -0,0 +1,182 @@
+"""Запуск бота несколькими процессами — кластерами шардов.
+
+Число шардов берётся из SHARD_COUNT или у Discord (GET /gateway/bot).
+Шарды делятся на CLUSTERS процессов (по умолчанию — по числу ядер), каждый
+запускает main.py с SHARD_COUNT, SHARD_IDS и CLUSTER_ID в окружении; порт
+метрик кластера — METRICS_PORT + номер кластера. Кластеры стартуют по
+очереди, чтобы вместе не превысить лимит подключений к шлюзу
+(max_concurrency подключений за 5 секунд). Упавший кластер перезапускается
+с нарастающей паузой, Ctrl+C / SIGTERM завершают все кластеры с
+сохранением данных.
+
+Кластеры запускаются в своём сеансе (на Windows — в своей группе
+процессов), поэтому Ctrl+C терминала до них не доходит: каждый получает от
+launcher ровно один сигнал остановки (SIGTERM, на Windows — CTRL_BREAK),
+по которому main.py закрывает бота и сохраняет данные.
+
+Сервер всегда обслуживается одним шардом, поэтому кластеры работают с
+разными данными; на случай пересечения (перешардирование, перезапуск,
+миграция) хранилища защищены блокировками, см. storage.py.
+
+Запуск:
+  python launcher.py
+"""
+
+import asyncio
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import discord
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(ROOT, "main.py")
+
+# Discord допускает max_concurrency подключений шардов за это время
+IDENTIFY_INTERVAL = 5.0
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 60.0
+# Кластер, проработавший дольше, считается запущенным успешно
+STABLE_AFTER = 60.0
+
+if sys.platform == "win32":
+    NEW_SESSION = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    STOP_SIGNAL = signal.CTRL_BREAK_EVENT
+else:
+    NEW_SESSION = {"start_new_session": True}
+    STOP_SIGNAL = signal.SIGTERM
+
+
+async def fetch_gateway(token: str) -> Tuple[int, int]:
+    """Рекомендуемое Discord число шардов и max_concurrency"""
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, session_start_limit = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shards, session_start_limit.get("max_concurrency", 1)
+
+
+def split_shards(shard_count: int, clusters: int) -> List[List[int]]:
+    """Разделить шарды на clusters почти равных последовательных групп"""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    groups, start = [], 0
+    for index in range(clusters):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+class Cluster:
+    """Процесс main.py с частью шардов; перезапускается при падении"""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.stopping = False
+
+    def environment(self) -> dict:
+        env = dict(os.environ)
+        env["SHARD_COUNT"] = str(self.shard_count)
+        env["SHARD_IDS"] = ",".join(map(str, self.shard_ids))
+        env["CLUSTER_ID"] = str(self.cluster_id)
+        metrics_port = os.getenv("METRICS_PORT")
+        if metrics_port:
+            env["METRICS_PORT"] = str(int(metrics_port) + self.cluster_id)
+        return env
+
+    async def run(self):
+        delay = RESTART_DELAY
+        while not self.stopping:
+            started = time.monotonic()
+            print(f"🚀 Кластер {self.cluster_id}: шарды {self.shard_ids[0]}–{self.shard_ids[-1]}")
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN, cwd=ROOT, env=self.environment(), **NEW_SESSION
+            )
+            if self.stopping:
+                # Остановка пришла, пока процесс запускался
+                self._signal()
+            code = await self.process.wait()
+            if self.stopping:
+                break
+            if time.monotonic() - started >= STABLE_AFTER:
+                delay = RESTART_DELAY
+            print(f"⚠️ Кластер {self.cluster_id} завершился с кодом {code}, перезапуск через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+    def stop(self):
+        """Остановить процесс одним сигналом; бот сохраняет данные перед выходом.
+
+        Повторный сигнал прервал бы сохранение, поэтому повторные вызовы
+        ничего не делают.
+        """
+        if self.stopping:
+            return
+        self.stopping = True
+        self._signal()
+
+    def _signal(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.send_signal(STOP_SIGNAL)
+
+
+async def launch():
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        print("❌ Токен не найден! Проверьте .env файл")
+        return
+
+    max_concurrency = int(os.getenv("MAX_CONCURRENCY", "1"))
+    if os.getenv("SHARD_COUNT"):
+        shard_count = int(os.getenv("SHARD_COUNT"))
+    else:
+        shard_count, max_concurrency = await fetch_gateway(token)
+    groups = split_shards(shard_count, int(os.getenv("CLUSTERS") or os.cpu_count() or 1))
+    clusters = [Cluster(index, shard_ids, shard_count) for index, shard_ids in enumerate(groups)]
+    print(f"🧩 Шардов: {shard_count}, кластеров: {len(clusters)}")
+
+    loop = asyncio.get_running_loop()
+
+    def stop_all():
+        for cluster in clusters:
+            cluster.stop()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_all)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+
+    tasks = []
+    try:
+        for index, cluster in enumerate(clusters):
+            if cluster.stopping:
+                break
+            if index:
+                # Следующий кластер — когда предыдущий успеет подключить свои шарды
+                previous = len(clusters[index - 1].shard_ids)
+                await asyncio.sleep(IDENTIFY_INTERVAL * math.ceil(previous / max_concurrency))
+            tasks.append(loop.create_task(cluster.run()))
+        await asyncio.gather(*tasks)
+    finally:
+        stop_all()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(launch())
+    except KeyboardInterrupt:
+        pass
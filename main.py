@@ -1,10 +1,23 @@
+import time
+
+# Отсчёт фаз запуска начинается до импорта тяжёлых модулей
+STARTED_AT = time.perf_counter()
+
+import asyncio
 import os
+import signal
 import sys  # For UTF-8 console reconfiguration
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 import traceback  # For detailed error traces
 
+from metrics import METRICS
+from outbox import OUTBOX, OutboxContext
+from storage import warn_unclaimed_legacy_files
+
+METRICS.observe_startup("import", time.perf_counter() - STARTED_AT)
+
 # Force UTF-8 encoding for console output (fixes UnicodeEncodeError on Windows)
 try:
     sys.stdout.reconfigure(encoding="utf-8")
@@ -24,36 +37,144 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
+class OutboxContextMixin:
+    async def get_context(self, origin, *, cls=OutboxContext):
+        """Ответы всех команд идут через общий слой вывода (outbox.py)"""
+        return await super().get_context(origin, cls=cls)
+
+
+class VinculumBot(OutboxContextMixin, commands.Bot):
+    pass
+
+
+class ShardedVinculumBot(OutboxContextMixin, commands.AutoShardedBot):
+    """Несколько шардов в одном процессе (кластеры запускает launcher.py)"""
+
+
+def shard_options() -> dict:
+    """Шарды процесса из .env: SHARD_COUNT, SHARD_IDS (через запятую), SHARDED"""
+    options = {}
+    if os.getenv("SHARD_COUNT"):
+        options["shard_count"] = int(os.getenv("SHARD_COUNT"))
+    if os.getenv("SHARD_IDS"):
+        options["shard_ids"] = [
+            int(shard_id) for shard_id in os.getenv("SHARD_IDS").split(",") if shard_id.strip()
+        ]
+    return options
+
+
 # Создание бота (добавлен case_insensitive=True для нечувствительности к регистру)
-bot = commands.Bot(
-    command_prefix=["!", "?", "/"], intents=intents, case_insensitive=True
+SHARDS = shard_options()
+bot_class = (
+    ShardedVinculumBot if SHARDS or os.getenv("SHARDED", "0") == "1" else VinculumBot
+)
+bot = bot_class(
+    command_prefix=["!", "?", "/"], intents=intents, case_insensitive=True, **SHARDS
 )
 
+# Замените 1234567890 на ваш реальный Discord user ID или задайте OWNER_ID в .env
+YOUR_OWNER_ID = int(os.getenv("OWNER_ID") or 1234567890)
 
-@bot.event
-async def on_ready():
-    await bot.change_presence(activity=discord.Game(name="!помощь"))
-    print(f"✅ Бот {bot.user} запущен!")
-    print(f"📊 Бот работает на {len(bot.guilds)} серверах")
 
-    # Debug: Выводим список всех команд для проверки загрузки (до загрузки когов)
-    print("📋 Загруженные команды (до когов):", [cmd.name for cmd in bot.commands])
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Засекаем время выполнения команды"""
+    ctx.command_started_at = time.perf_counter()
+
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    """Записываем задержку команды в гистограмму"""
+    started = getattr(ctx, "command_started_at", None)
+    if started is not None and ctx.command is not None:
+        METRICS.observe_command(
+            ctx.command.qualified_name,
+            time.perf_counter() - started,
+            failed=ctx.command_failed,
+        )
+
 
-    # Загружаем коги (теперь асинхронно)
+def install_shutdown_handler():
+    """SIGTERM (на Windows — CTRL_BREAK от launcher.py) закрывает бота штатно.
+
+    bot.close() выгружает коги, и они сохраняют данные; без обработчика
+    процесс завершился бы сразу, потеряв отложенные изменения.
+    """
+    loop = asyncio.get_running_loop()
+
+    def shutdown():
+        if not bot.is_closed():
+            print("🛑 Получен сигнал остановки, сохраняем данные и выходим")
+            bot.shutdown_task = loop.create_task(bot.close())
+
+    if sys.platform == "win32":
+        signal.signal(signal.SIGBREAK, lambda *_: loop.call_soon_threadsafe(shutdown))
+    else:
+        loop.add_signal_handler(signal.SIGTERM, shutdown)
+
+
+async def setup_hook():
+    """Однократная настройка после входа: коги регистрируются до подключения к шлюзу.
+
+    В отличие от on_ready, который срабатывает при каждом переподключении,
+    setup_hook вызывается один раз за запуск.
+    """
+    install_shutdown_handler()
+    warn_unclaimed_legacy_files()
+    METRICS.observe_startup("login", time.perf_counter() - bot.run_started_at)
+    # Замер задержки цикла событий и HTTP эндпоинт метрик (если задан METRICS_PORT)
+    metrics_port = os.getenv("METRICS_PORT")
+    METRICS.start(
+        bot,
+        host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        port=int(metrics_port) if metrics_port else None,
+    )
+
+    started = time.perf_counter()
     try:
-        await load_cogs()  # Await the async function
+        await load_cogs()
         print("✅ Все коги загружены!")
-
-        # Enhanced Debug: Check if cog is actually added
         print("🔍 Загруженные коги:", list(bot.cogs.keys()))
-        print(
-            "📋 Полный список команд (после когов):", [cmd.name for cmd in bot.commands]
-        )
+        print("📋 Полный список команд:", [cmd.name for cmd in bot.commands])
         if not bot.cogs:
             print("⚠️ ВНИМАНИЕ: Ни один ког не загружен! Проверьте ошибки выше.")
     except Exception as e:
         print(f"❌ Ошибка загрузки когов: {e}")
         traceback.print_exc()  # Full traceback for debugging
+    METRICS.observe_startup("cogs", time.perf_counter() - started)
+
+
+bot.setup_hook = setup_hook
+bot.run_started_at = STARTED_AT
+
+
+@bot.event
+async def on_ready():
+    await bot.change_presence(activity=discord.Game(name="!помощь"))
+    print(f"✅ Бот {bot.user} запущен!")
+    print(f"📊 Бот работает на {len(bot.guilds)} серверах")
+    if "ready" in METRICS.startup:
+        return  # Переподключение: данные уже загружаются или загружены
+    METRICS.observe_startup("ready", time.perf_counter() - STARTED_AT)
+    # Данные серверов подгружаются в фоне, команды отвечают сразу
+    if os.getenv("PRELOAD_GUILDS", "1") != "0":
+        bot.preload_task = asyncio.create_task(preload_guild_data())
+
+
+async def preload_guild_data():
+    """Фоновая загрузка данных серверов бота (в пределах GUILD_CACHE_MB)"""
+    cog = bot.get_cog("RelationshipCog")
+    if cog is None or not hasattr(cog.registry, "preload"):
+        return
+    started = time.perf_counter()
+    try:
+        loaded = await cog.registry.preload([guild.id for guild in bot.guilds])
+    except Exception as e:
+        print(f"⚠️ Ошибка фоновой загрузки данных: {e}")
+        traceback.print_exc()
+        return
+    METRICS.observe_startup("data", time.perf_counter() - started)
+    print(f"📂 Данные загружены в фоне: {loaded} серверов")
 
 
 async def load_cogs():  # Async function for Discord.py 2.x
@@ -90,6 +211,12 @@ async def on_command_error(ctx, error):
         return
 
     if isinstance(error, commands.CommandNotFound):
+        # `/` и `?` в начале обычного текста пишут постоянно — на них не отвечаем
+        if ctx.prefix != "!":
+            return
+        # Одно напоминание на канал в минуту, остальные подавляются
+        if not OUTBOX.allow_notice(("command_not_found", ctx.channel.id)):
+            return
         # Если команда не найдена, напоминаем о префиксе
         embed = discord.Embed(
             title="❓ Команда не найдена",
@@ -98,12 +225,17 @@ async def on_command_error(ctx, error):
         )
         await ctx.send(embed=embed, delete_after=10)  # Автоудаление через 10 сек
 
-        # Debug: Log full error to console
         print(f"⚠️ CommandNotFound для '{ctx.invoked_with}' от {ctx.author}: {error}")
-        traceback.print_exc()
+    elif isinstance(error, commands.UserInputError) and ctx.command is not None:
+        # Неверные аргументы: подсказка с синтаксисом, повторная — не раньше чем через 10 сек
+        key = ("input_error", ctx.channel.id, ctx.author.id, ctx.command.qualified_name)
+        if OUTBOX.allow_notice(key, ttl=10):
+            usage = f"!{ctx.command.qualified_name} {ctx.command.signature}".rstrip()
+            await ctx.send(f"❌ {error}\nИспользование: `{usage}`")
     else:
-        # Для других ошибок (например, недостаточно аргументов) - стандартное поведение
-        await bot.on_command_error(ctx, error)  # Передаем дальше
+        # Для других ошибок - стандартное поведение (трассировка в консоль).
+        # bot.on_command_error здесь — этот же обработчик, поэтому вызываем базовый
+        await commands.Bot.on_command_error(bot, ctx, error)
 
 
 @bot.command()
@@ -118,11 +250,19 @@ async def помощь(ctx):
     commands_list = {
         "!добавить [имя]": "Добавить персонажа",
         "!удалить [имя]": "Удалить персонажа",
+        "!добавить_много [имя1, имя2, ...]": "Добавить нескольких персонажей",
+        "!удалить_много [имя1, имя2, ...]": "Удалить нескольких персонажей",
+        "!импорт + файлы JSON/CSV": "Импорт персонажей и отношений",
+        "!экспорт [json|csv]": "Экспорт персонажей и отношений в файл",
         "!персонажи": "Список персонажей",
         "!бросок": "Определить отношения",
         "!таблица": "Таблица отношений",
         "!отношения [имя]": "Детальные отношения (опционально)",
         "!перебросить [имя1] [имя2]": "Перебросить отношение",
+        "!перебросить_все [все|исходящие|входящие] [имя]": "Перебросить все отношения графа или персонажа",
+        "!кто_любит [имя]": "Кто относится к персонажу лучше всех",
+        "!взаимная_любовь": "Пары со взаимной любовью",
+        "!средние": "Среднее отношение к каждому персонажу",
     }
 
     for cmd, desc in commands_list.items():
@@ -130,7 +270,7 @@ async def помощь(ctx):
 
     embed.add_field(
         name="💡 Подсказка",
-        value="Имена могут содержать пробелы (например, `!добавить Alice Bob`). Команды нечувствительны к регистру.",
+        value="Имена могут содержать пробелы (например, `!добавить Alice Bob`). Команды нечувствительны к регистру. Команды доступны и как слэш-команды (`/перебросить`) с подсказками имен.",
         inline=False,
     )
 
@@ -140,12 +280,16 @@ async def помощь(ctx):
 @bot.command()
 async def перезагрузить(ctx):
     """Перезагрузить коги (только для владельца)"""
-    # Замените YOUR_OWNER_ID на ваш реальный Discord user ID (число, например, 1234567890)
-    YOUR_OWNER_ID = 1234567890  # <-- ВСТАВЬТЕ СЮДА СВОЙ ID
     if ctx.author.id != YOUR_OWNER_ID:
         return await ctx.send("❌ Недостаточно прав!")
 
+    started = time.perf_counter()
     try:
+        # Данные в памяти и отложенные сохранения переходят к новому экземпляру кога
+        current = bot.get_cog("RelationshipCog")
+        if current is not None and hasattr(current, "hand_over"):
+            current.hand_over()
+
         # Для перезагрузки: используем reload_extension (async в 2.x)
         for cog in ["cogs.relationships"]:
             try:
@@ -165,14 +309,122 @@ async def перезагрузить(ctx):
                     print(f"❌ Fallback failed for {cog}: {fallback_e}")
                     await ctx.send(f"❌ Fallback failed: {fallback_e}")
 
-        await ctx.send("✅ Коги перезагружены!")
+        # Состояние никто не принял (ког не загрузился) — сохраняем, чтобы не потерять
+        orphaned = getattr(bot, "relationship_state", None)
+        if orphaned is not None:
+            del bot.relationship_state
+            await orphaned.flush_all()
+            print("💾 Непринятое состояние кога сохранено на диск")
+
+        elapsed = (time.perf_counter() - started) * 1000
+        await ctx.send(f"✅ Коги перезагружены за {elapsed:.0f} мс!")
     except Exception as e:
         await ctx.send(f"❌ Ошибка: {e}")
 
 
+@bot.command()
+async def синхронизировать(ctx, scope: str = None):
+    """Зарегистрировать слэш-команды в Discord (только для владельца).
+
+    Без аргумента — глобально (обновление до часа), `здесь` — сразу на этом сервере.
+    """
+    if ctx.author.id != YOUR_OWNER_ID:
+        return await ctx.send("❌ Недостаточно прав!")
+
+    try:
+        if scope == "здесь" and ctx.guild is not None:
+            bot.tree.copy_global_to(guild=ctx.guild)
+            synced = await bot.tree.sync(guild=ctx.guild)
+        else:
+            synced = await bot.tree.sync()
+    except discord.HTTPException as e:
+        return await ctx.send(f"❌ Ошибка синхронизации: {e}")
+    print(f"🔄 Синхронизировано слэш-команд: {len(synced)}")
+    await ctx.send(f"✅ Синхронизировано слэш-команд: {len(synced)}")
+
+
+@bot.command()
+async def статистика(ctx):
+    """Статистика производительности бота (только для владельца)"""
+    if ctx.author.id != YOUR_OWNER_ID:
+        return await ctx.send("❌ Недостаточно прав!")
+
+    embed = discord.Embed(title="📈 Статистика производительности", color=0x00BFFF)
+
+    def ms(seconds):
+        return f"{seconds * 1000:.1f} мс"
+
+    def gateway_ms(seconds):
+        # До первого heartbeat задержка шлюза — nan или inf
+        return ms(seconds) if seconds == seconds and seconds != float("inf") else "—"
+
+    lines = [
+        f"`{name}`: {hist.count} шт., p50 {ms(hist.quantile(0.5))}, "
+        f"p99 {ms(hist.quantile(0.99))}, макс {ms(hist.max)}"
+        + (f", ошибок {METRICS.command_errors[name]}" if name in METRICS.command_errors else "")
+        for name, hist in sorted(METRICS.commands.items())
+    ]
+    embed.add_field(
+        name="⏱️ Команды", value="\n".join(lines)[:1024] or "Нет данных", inline=False
+    )
+
+    lines = [
+        f"`{operation}`: {hist.count} шт., среднее {ms(hist.mean)}, "
+        f"макс {ms(hist.max)}, {METRICS.io_bytes.get(operation, 0) / 1024:.1f} КБ"
+        for operation, hist in sorted(METRICS.io.items())
+    ]
+    embed.add_field(
+        name="💾 Загрузка/сохранение", value="\n".join(lines) or "Нет данных", inline=False
+    )
+
+    lag = METRICS.loop_lag
+    embed.add_field(
+        name="🔁 Цикл событий",
+        value=f"Задержка p99 {ms(lag.quantile(0.99))}, макс {ms(lag.max)}",
+        inline=False,
+    )
+    if METRICS.startup:
+        embed.add_field(
+            name="🚀 Запуск",
+            value=", ".join(
+                f"{phase} {ms(seconds)}" for phase, seconds in METRICS.startup.items()
+            ),
+            inline=False,
+        )
+    embed.add_field(name="📡 Шлюз", value=f"Задержка {gateway_ms(bot.latency)}", inline=True)
+    if isinstance(bot, commands.AutoShardedBot):
+        shards = ", ".join(
+            f"#{shard_id} {gateway_ms(shard_latency)}" for shard_id, shard_latency in bot.latencies
+        )
+        cluster = os.getenv("CLUSTER_ID")
+        embed.add_field(
+            name="🧩 Шарды" + (f" (кластер {cluster})" if cluster else ""),
+            value=f"{shards or '—'} из {bot.shard_count}"[:1024],
+            inline=False,
+        )
+
+    embed.add_field(
+        name="📤 Отправка",
+        value=(
+            f"Сообщений {OUTBOX.sent}, повторов после 429: {OUTBOX.retried}, "
+            f"подавлено уведомлений: {OUTBOX.suppressed}"
+        ),
+        inline=False,
+    )
+    cog = bot.get_cog("RelationshipCog")
+    if cog is not None and hasattr(cog.registry, "resident"):
+        embed.add_field(
+            name="🗂️ Серверы в памяти",
+            value=f"{len(cog.registry)} из {len(bot.guilds)}",
+            inline=True,
+        )
+    await ctx.send(embed=embed)
+
+
 if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN")
     if token:
+        bot.run_started_at = time.perf_counter()
         bot.run(token)
     else:
         print("❌ Токен не найден! Проверьте .env файл")
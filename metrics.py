@@ -0,0 +1,211 @@
+"""Метрики производительности бота.
+
+Гистограммы задержек команд, время и объём загрузки/сохранения данных,
+задержка цикла событий, длительность фаз запуска и задержка шлюза Discord. Доступны через команду
+!статистика и (если задан METRICS_PORT) в текстовом формате Prometheus по
+адресу http://METRICS_HOST:METRICS_PORT/metrics.
+"""
+
+import asyncio
+import bisect
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    math.inf,
+)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (потокобезопасная)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.max if math.isinf(bound) else min(bound, self.max)
+            return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Все метрики процесса"""
+
+    def __init__(self):
+        self.commands: Dict[str, Histogram] = {}
+        self.command_errors: Dict[str, int] = {}
+        self.io: Dict[str, Histogram] = {}
+        self.io_bytes: Dict[str, int] = {}
+        self.loop_lag = Histogram()
+        # Длительность фаз запуска (import, login, cogs, ready, data), секунды
+        self.startup: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    def _histogram(self, table: Dict[str, Histogram], key: str) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram())
+        return histogram
+
+    def observe_command(self, name: str, seconds: float, failed: bool = False):
+        self._histogram(self.commands, name).observe(seconds)
+        if failed:
+            with self._lock:
+                self.command_errors[name] = self.command_errors.get(name, 0) + 1
+
+    def observe_io(self, operation: str, seconds: float, nbytes: int):
+        """Загрузка/сохранение данных (operation: load или save)"""
+        self._histogram(self.io, operation).observe(seconds)
+        with self._lock:
+            self.io_bytes[operation] = self.io_bytes.get(operation, 0) + nbytes
+
+    def observe_startup(self, phase: str, seconds: float):
+        """Фаза запуска; повторные замеры (переподключения) не перезаписывают первый"""
+        if phase not in self.startup:
+            self.startup[phase] = seconds
+            print(f"🚀 Запуск: {phase} — {seconds * 1000:.0f} мс")
+
+    async def _monitor_loop_lag(self, interval: float):
+        """Насколько позже запланированного просыпается цикл событий"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, loop.time() - start - interval))
+
+    def start(self, bot, interval: float = 0.5, host: str = "127.0.0.1", port: Optional[int] = None):
+        """Запустить фоновый замер задержки цикла и (опционально) HTTP эндпоинт"""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks.append(loop.create_task(self._monitor_loop_lag(interval)))
+        if port:
+            self._tasks.append(loop.create_task(self._serve(bot, host, port)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    async def _serve(self, bot, host: str, port: int):
+        async def handle(reader, writer):
+            try:
+                request = await reader.readline()
+                # Заголовки запроса не нужны, но их надо дочитать
+                while (await reader.readline()).strip():
+                    pass
+                if request.split(b" ")[1:2] == [b"/metrics"]:
+                    body = self.prometheus_text(bot).encode("utf-8")
+                    status = b"200 OK"
+                else:
+                    body, status = b"not found\n", b"404 Not Found"
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\n"
+                    b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                    b"Connection: close\r\n\r\n" + body
+                )
+                await writer.drain()
+            except (ConnectionError, IndexError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        print(f"📈 Метрики Prometheus: http://{host}:{port}/metrics")
+        async with server:
+            await server.serve_forever()
+
+    def prometheus_text(self, bot=None) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+
+        def histogram(name: str, help_text: str, series: Dict[str, Histogram], label: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(series.items()):
+                labels = f'{label}="{escape_label(key)}"' if label else ""
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    sep = "," if labels else ""
+                    lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+                braces = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{braces} {hist.sum}")
+                lines.append(f"{name}_count{braces} {hist.count}")
+
+        histogram(
+            "vinculum_command_seconds", "Command latency", self.commands, "command"
+        )
+        lines.append("# HELP vinculum_command_errors_total Failed command invocations")
+        lines.append("# TYPE vinculum_command_errors_total counter")
+        for name, count in sorted(self.command_errors.items()):
+            lines.append(f'vinculum_command_errors_total{{command="{escape_label(name)}"}} {count}')
+        histogram("vinculum_storage_seconds", "Data load/save time", self.io, "operation")
+        lines.append("# HELP vinculum_storage_bytes_total Bytes read/written by storage")
+        lines.append("# TYPE vinculum_storage_bytes_total counter")
+        for operation, nbytes in sorted(self.io_bytes.items()):
+            lines.append(f'vinculum_storage_bytes_total{{operation="{operation}"}} {nbytes}')
+        histogram("vinculum_event_loop_lag_seconds", "Event loop lag", {"": self.loop_lag}, "")
+        if self.startup:
+            lines.append("# HELP vinculum_startup_phase_seconds Startup phase duration")
+            lines.append("# TYPE vinculum_startup_phase_seconds gauge")
+            for phase, seconds in self.startup.items():
+                lines.append(f'vinculum_startup_phase_seconds{{phase="{phase}"}} {seconds}')
+        if bot is not None:
+            latency = bot.latency
+            if not math.isnan(latency) and not math.isinf(latency):
+                lines.append("# HELP vinculum_gateway_latency_seconds Gateway heartbeat latency")
+                lines.append("# TYPE vinculum_gateway_latency_seconds gauge")
+                lines.append(f"vinculum_gateway_latency_seconds {latency}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Метрики процесса (общие для main.py, когов и хранилищ)
+METRICS = Metrics()
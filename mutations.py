@@ -0,0 +1,70 @@
+"""Очередь изменений сервера: единственный писатель с пакетной обработкой.
+
+Команды не изменяют данные напрямую, а отправляют изменение в очередь
+сервера. Обработчик выполняет изменения строго по одному в порядке
+поступления. Изменения, пришедшие подряд, составляют один пакет: после
+пакета сохранение планируется один раз. Обычно изменение — синхронная функция
+в цикле событий, поэтому чтения (таблица, списки) всегда видят состояние
+между изменениями и не ждут очередь. Изменение может вернуть корутину
+(перечитывание данных): следующие изменения ждут её завершения.
+"""
+
+import asyncio
+import inspect
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class MutationQueue:
+    """Последовательное применение изменений одного сервера"""
+
+    def __init__(self, on_batch: Callable[[], None], max_batch: int = 256):
+        self.on_batch = on_batch
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Callable[..., Any], tuple, asyncio.Future]] = []
+        self._worker: Optional[asyncio.Task] = None
+        # Статистика: изменений и пакетов (для оценки объединения)
+        self.applied = 0
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, mutation: Callable[..., Any], *args) -> Any:
+        """Выполнить mutation(*args) в очереди сервера и вернуть её результат"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((mutation, args, future))
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        return await future
+
+    async def _run(self):
+        # Даём командам, пришедшим в ту же итерацию цикла, попасть в пакет
+        await asyncio.sleep(0)
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            changed = False
+            for mutation, args, future in batch:
+                if future.cancelled():
+                    continue
+                try:
+                    result = mutation(*args)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    if not future.cancelled():
+                        future.set_result(result)
+                    changed = True
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+            self.applied += len(batch)
+            self.batches += 1
+            if changed:
+                self.on_batch()  # Одно сохранение на пакет
+            await asyncio.sleep(0)
+
+    async def drain(self):
+        """Дождаться применения всех отправленных изменений"""
+        while self._worker is not None and not self._worker.done():
+            await asyncio.shield(self._worker)
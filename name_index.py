@@ -0,0 +1,139 @@
+"""Индекс имён персонажей для автодополнения и подсказок при опечатках.
+
+Префиксное дерево по именам без учёта регистра отдаёт до limit вариантов,
+начинающихся с введённого текста, не перебирая все имена. Если таких
+меньше limit, добавляются похожие имена из индекса триграмм (опечатки,
+пропущенные буквы). Индекс обновляется при добавлении и удалении персонажа.
+"""
+
+import difflib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+# Сколько кандидатов по триграммам сравнивается точно (difflib)
+FUZZY_CANDIDATES = 50
+FUZZY_CUTOFF = 0.5
+
+
+def normalize(name: str) -> str:
+    return name.casefold()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class _Node:
+    __slots__ = ("children", "names")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.names: Set[str] = set()  # Имена, нормализованная форма которых кончается здесь
+
+
+class NameIndex:
+    """Префиксное дерево и индекс триграмм по именам персонажей"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._root = _Node()
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._count = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _find(self, key: str) -> Optional[_Node]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def add(self, name: str):
+        key = normalize(name)
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        if name in node.names:
+            return
+        node.names.add(name)
+        self._count += 1
+        for gram in trigrams(key):
+            self._trigrams.setdefault(gram, set()).add(name)
+
+    def remove(self, name: str):
+        key = normalize(name)
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        if name not in path[-1].names:
+            return
+        path[-1].names.discard(name)
+        self._count -= 1
+        # Убираем опустевшие узлы снизу вверх
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.names or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+        for gram in trigrams(key):
+            names = self._trigrams.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._trigrams[gram]
+
+    def lookup(self, query: str) -> List[str]:
+        """Имена, совпадающие с query без учёта регистра"""
+        node = self._find(normalize(query.strip()))
+        return sorted(node.names) if node is not None else []
+
+    def prefix(self, query: str, limit: int = 25) -> List[str]:
+        """До limit имён, начинающихся с query (короткие — первыми)"""
+        node = self._find(normalize(query))
+        if node is None:
+            return []
+        found: List[str] = []
+        level = [node]
+        # Обход в ширину: сначала более короткие продолжения
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                found.extend(sorted(current.names))
+                next_level.extend(
+                    current.children[char] for char in sorted(current.children)
+                )
+            level = next_level
+        return found[:limit]
+
+    def fuzzy(self, query: str, limit: int = 25) -> List[str]:
+        """До limit имён, похожих на query (по общим триграммам)"""
+        key = normalize(query.strip())
+        if not key:
+            return []
+        counts: Counter = Counter()
+        for gram in trigrams(key):
+            counts.update(self._trigrams.get(gram, ()))
+        scored = []
+        for name, _ in counts.most_common(FUZZY_CANDIDATES):
+            ratio = difflib.SequenceMatcher(None, key, normalize(name)).ratio()
+            if ratio >= FUZZY_CUTOFF:
+                scored.append((-ratio, name))
+        return [name for _, name in sorted(scored)[:limit]]
+
+    def complete(self, query: str, limit: int = 25) -> List[str]:
+        """Варианты для автодополнения: по префиксу, затем похожие"""
+        found = self.prefix(query.strip(), limit)
+        if len(found) < limit:
+            seen = set(found)
+            found += [
+                name for name in self.fuzzy(query, limit) if name not in seen
+            ][: limit - len(found)]
+        return found
@@ -0,0 +1,158 @@
+"""Общий слой отправки сообщений.
+
+Все ответы команд проходят через OutboxContext.send:
+  * embed обрезаются под лимиты Discord, списки embed упаковываются по
+    10 штук и 6000 символов на сообщение;
+  * сообщения в канал отправляются по очереди с учётом лимита канала
+    (CHANNEL_RATE сообщений за CHANNEL_PER секунд), а при 429 — повтор
+    после паузы, без лишних запросов к API;
+  * повторяющиеся служебные уведомления (например, «команда не найдена»)
+    подавляются на время NOTICE_TTL.
+
+Ответы на слэш-команды идут напрямую: первый ответ на взаимодействие должен
+уйти в течение трёх секунд и не считается сообщением канала.
+"""
+
+import asyncio
+import collections
+import time
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import discord
+from discord.ext import commands
+
+from rendering import MESSAGE_CONTENT_LIMIT, group_embeds
+
+# Лимит отправки в канал Discord: 5 сообщений за 5 секунд
+CHANNEL_RATE = 5
+CHANNEL_PER = 5.0
+NOTICE_TTL = 60.0
+MAX_RETRIES = 3
+
+
+class Outbox:
+    """Очереди отправки по каналам и подавление повторных уведомлений"""
+
+    def __init__(self, rate: int = CHANNEL_RATE, per: float = CHANNEL_PER):
+        self.rate = rate
+        self.per = per
+        self._queues: Dict[int, Deque[Tuple[Callable, asyncio.Future]]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._sent_at: Dict[int, Deque[float]] = {}
+        self._notices: Dict[Hashable, float] = {}
+        # Счётчики для !статистика
+        self.sent = 0
+        self.retried = 0
+        self.suppressed = 0
+
+    def allow_notice(self, key: Hashable, ttl: float = NOTICE_TTL) -> bool:
+        """Можно ли отправить уведомление key (одинаковые — не чаще раза в ttl)"""
+        now = time.monotonic()
+        if len(self._notices) > 1024:
+            self._notices = {k: t for k, t in self._notices.items() if t > now}
+        if self._notices.get(key, 0.0) > now:
+            self.suppressed += 1
+            return False
+        self._notices[key] = now + ttl
+        return True
+
+    async def send(self, channel_id: int, sends: Sequence[Callable[[], Awaitable]]) -> list:
+        """Поставить отправки в очередь канала подряд и дождаться результатов"""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in sends]
+        # Сообщения одного ответа идут подряд, без вклинивания чужих
+        self._queues.setdefault(channel_id, collections.deque()).extend(zip(sends, futures))
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = loop.create_task(self._run(channel_id))
+        return list(await asyncio.gather(*futures))
+
+    async def _wait_for_slot(self, channel_id: int):
+        sent_at = self._sent_at.setdefault(channel_id, collections.deque())
+        now = time.monotonic()
+        while sent_at and now - sent_at[0] >= self.per:
+            sent_at.popleft()
+        if len(sent_at) >= self.rate:
+            await asyncio.sleep(self.per - (now - sent_at[0]))
+            sent_at.popleft()
+        sent_at.append(time.monotonic())
+
+    async def _run(self, channel_id: int):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                send, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                for attempt in range(MAX_RETRIES + 1):
+                    await self._wait_for_slot(channel_id)
+                    try:
+                        result = await send()
+                    except discord.HTTPException as e:
+                        if e.status == 429 and attempt < MAX_RETRIES:
+                            self.retried += 1
+                            await asyncio.sleep(getattr(e, "retry_after", None) or 1.0)
+                            continue
+                        if not future.cancelled():
+                            future.set_exception(e)
+                    except Exception as e:
+                        if not future.cancelled():
+                            future.set_exception(e)
+                    else:
+                        self.sent += 1
+                        if not future.cancelled():
+                            future.set_result(result)
+                    break
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+            self._prune()
+
+    def _prune(self):
+        """Забыть каналы, в которые давно ничего не отправлялось"""
+        if len(self._sent_at) <= 1024:
+            return
+        now = time.monotonic()
+        for channel_id in [
+            channel_id
+            for channel_id, sent_at in self._sent_at.items()
+            if not sent_at or now - sent_at[-1] >= self.per
+        ]:
+            del self._sent_at[channel_id]
+
+
+# Очереди отправки процесса (общие для main.py и когов)
+OUTBOX = Outbox()
+
+
+class OutboxContext(commands.Context):
+    """Контекст команд, отправляющий ответы через общий слой вывода"""
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        if content is not None:
+            content = str(content)[:MESSAGE_CONTENT_LIMIT]
+        embed = kwargs.pop("embed", None)
+        embeds: List[discord.Embed] = list(kwargs.pop("embeds", None) or ())
+        if embed is not None:
+            embeds.insert(0, embed)
+        # group_embeds обрезает каждый embed под лимиты и делит по сообщениям
+        groups = group_embeds(embeds) if embeds else [[]]
+
+        parent_send = super().send
+        sends = []
+        for number, group in enumerate(groups):
+            options = dict(kwargs) if number == 0 else {
+                key: kwargs[key] for key in ("delete_after", "allowed_mentions") if key in kwargs
+            }
+            if group:
+                options["embeds"] = group
+            text = content if number == 0 else None
+            sends.append(lambda text=text, options=options: parent_send(text, **options))
+
+        if self.interaction is not None:
+            # Ответ на взаимодействие — напрямую (срок ответа три секунды)
+            messages = [await send() for send in sends]
+        else:
+            messages = await OUTBOX.send(self.channel.id, sends)
+        return messages[0]
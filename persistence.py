@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import traceback
+from typing import Any, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = 2) -> int:
+    """Атомарная запись JSON: временный файл рядом + os.replace.
+
+    Возвращает число записанных байт.
+    """
+    payload = json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp создаёт файл с правами 0600 — сохраняем права исходного файла
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(payload)
+
+
+class FileLock:
+    """Межпроцессная рекомендательная блокировка на файле (flock / msvcrt).
+
+    Защищает чтение и запись данных сервера, если с ними работают несколько
+    процессов (кластеры шардов, миграция). Не реентерабельна.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            f = open(self.path, "a+b")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                f.close()
+                raise
+            self._file = f
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        f, self._file = self._file, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            f.close()
+            self._thread_lock.release()
+
+
+class WriteBehindSaver:
+    """Отложенное сохранение: серия изменений объединяется в одну запись.
+
+    prepare() вызывается в цикле событий и снимает согласованный снимок
+    данных, write(snapshot) выполняется в рабочем потоке.
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[], Any],
+        write: Callable[[Any], None],
+        delay: float = 2.0,
+    ):
+        self.prepare = prepare
+        self.write = write
+        self.delay = delay
+        self.dirty = False
+        self._timer: Optional[asyncio.Task] = None
+        self._sleeping = False
+        self._lock: Optional[asyncio.Lock] = None
+
+    def schedule(self):
+        """Отметить данные изменёнными и запланировать запись"""
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Нет цикла событий (скрипты, миграции) — пишем сразу
+            self.dirty = False
+            self.write(self.prepare())
+            return
+        if self._timer is None or self._timer.done():
+            self._timer = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Изменения, пришедшие во время записи, попадут в следующий проход
+        while self.dirty:
+            self._sleeping = True
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self._sleeping = False
+            await self._write_now()
+
+    async def _write_now(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            snapshot = self.prepare()
+            try:
+                await asyncio.to_thread(self.write, snapshot)
+            except Exception as e:
+                # Оставляем данные грязными, чтобы повторить при следующей записи
+                self.dirty = True
+                print(f"⚠️ Ошибка фонового сохранения: {e}")
+                traceback.print_exc()
+
+    async def flush(self):
+        """Немедленно записать накопленные изменения (например, при выключении)"""
+        # Таймер отменяем только пока он ждёт: запись в потоке прерывать нельзя
+        if self._timer is not None and self._sleeping:
+            self._timer.cancel()
+        await self._write_now()
@@ -0,0 +1,354 @@
+"""Отображение таблицы и списков отношений с кэшем и разбиением на страницы.
+
+Готовые страницы кэшируются по версии данных сервера и пересобираются только
+после изменений. Большие таблицы режутся на плитки (блоки строк и столбцов),
+чтобы каждая помещалась в лимит описания embed. Несколько страниц
+показываются одним сообщением с кнопками листания (PageView).
+"""
+
+import weakref
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+import discord
+
+# Лимиты Discord
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_FIELDS_LIMIT = 25
+EMBED_FIELD_NAME_LIMIT = 256
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_FOOTER_LIMIT = 2048
+EMBED_TOTAL_LIMIT = 6000
+EMBEDS_PER_MESSAGE = 10
+MESSAGE_CONTENT_LIMIT = 2000
+
+# Размер страницы с запасом под заголовок и служебные символы
+PAGE_CHARS = 3800
+# Столбцов в одной плитке таблицы (ширина строки 15 + 9 * столбцов)
+TABLE_TILE_COLUMNS = 8
+
+# Сколько секунд после последнего нажатия работают кнопки листания
+PAGINATOR_TIMEOUT = 600.0
+
+TABLE_COLOR = 0xFFD700
+DETAILS_COLOR = 0xFF69B4
+CHARACTERS_COLOR = 0x9370DB
+
+
+class RenderCache:
+    """Кэш готовых страниц одной системы; сбрасывается при смене версии данных"""
+
+    def __init__(self):
+        self.version = None
+        self.pages: Dict[Hashable, List[discord.Embed]] = {}
+
+    def get(
+        self, system, key: Hashable, build: Callable[[], List[discord.Embed]]
+    ) -> List[discord.Embed]:
+        if self.version != system.version:
+            self.pages.clear()
+            self.version = system.version
+        pages = self.pages.get(key)
+        if pages is None:
+            pages = self.pages[key] = build()
+        return pages
+
+
+class Renderer:
+    """Страницы для !таблица, !отношения и !персонажи с кэшем на каждый сервер"""
+
+    def __init__(self, descriptions: Dict[int, str]):
+        self.descriptions = descriptions
+        # Кэш живёт, пока система сервера загружена в память
+        self._caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _cache(self, system) -> RenderCache:
+        cache = self._caches.get(system)
+        if cache is None:
+            cache = self._caches[system] = RenderCache()
+        return cache
+
+    def table(self, system) -> List[discord.Embed]:
+        return self._cache(system).get(system, "table", lambda: self._table(system))
+
+    def details(self, system, character_name: str = None) -> List[discord.Embed]:
+        return self._cache(system).get(
+            system, ("details", character_name), lambda: self._details(system, character_name)
+        )
+
+    def characters(self, system) -> List[discord.Embed]:
+        return self._cache(system).get(system, "characters", lambda: self._characters(system))
+
+    def _characters(self, system) -> List[discord.Embed]:
+        names = sorted(system.characters)
+        embeds = [
+            discord.Embed(title="👥 Список персонажей", description=page, color=CHARACTERS_COLOR)
+            for page in paginate_lines(
+                [f"• {name}" for name in names], f"Всего персонажей: {len(names)}\n\n"
+            )
+        ]
+        set_page_footers(embeds)
+        return embeds
+
+    def _table(self, system) -> List[discord.Embed]:
+        characters = sorted(system.characters.keys())
+        relationships = system.relationships
+        row_width = 15 + 9 * TABLE_TILE_COLUMNS + 1
+        rows_per_tile = max(1, (PAGE_CHARS - 2 * row_width) // row_width)
+
+        # Ячейки строки считаются один раз и переиспользуются во всех плитках:
+        # outgoing() ленивого броска вычисляет значения заново при каждом вызове
+        labels = {value: f"    {value}    " for value in self.descriptions}
+        rows = []
+        for char1 in characters:  # From
+            outgoing = relationships.outgoing(char1)
+            cells = []
+            for char2 in characters:  # To
+                if char1 == char2:
+                    cells.append("    —    ")
+                else:
+                    # Directed from char1 to char2
+                    rel = outgoing.get(char2)
+                    cells.append(labels[rel.value] if rel else "    ?    ")
+            rows.append((f"{char1[:14]:<14} ", cells))
+
+        tiles = []
+        for col_start in range(0, len(characters), TABLE_TILE_COLUMNS):
+            col_end = col_start + TABLE_TILE_COLUMNS
+            columns = characters[col_start:col_end]
+            # Создаем таблицу: строки = from, столбцы = to
+            header = [" " * 15 + "".join(f"{char[:8]:>8} " for char in columns)]
+            header.append("-" * (15 + 9 * len(columns)))
+            for row_start in range(0, len(characters), rows_per_tile):
+                lines = list(header)
+                for label, cells in rows[row_start : row_start + rows_per_tile]:
+                    lines.append(label + "".join(cells[col_start:col_end]))
+                tiles.append(
+                    (
+                        row_start,
+                        col_start,
+                        len(columns),
+                        "```\n" + "\n".join(lines) + "\n```",
+                    )
+                )
+
+        embeds = []
+        total = len(characters)
+        for row_start, col_start, width, text in tiles:
+            title = "📊 Таблица отношений (направленная)"
+            if len(tiles) > 1:
+                row_end = min(row_start + rows_per_tile, total)
+                title += (
+                    f" — строки {row_start + 1}–{row_end},"
+                    f" столбцы {col_start + 1}–{col_start + width}"
+                )
+            embeds.append(discord.Embed(title=title, description=text, color=TABLE_COLOR))
+
+        # Легенда
+        legend = "".join(f"{value}: {desc}\n" for value, desc in self.descriptions.items())
+        embeds[-1].add_field(name="🎯 Легенда", value=legend, inline=False)
+        set_page_footers(
+            embeds, "Строки: отношение ОТ персонажа, Столбцы: К персонажу"
+        )
+        return embeds
+
+    def _details(self, system, character_name: str = None) -> List[discord.Embed]:
+        relationships = system.relationships
+        if character_name:
+            # Только исходящие отношения от character_name к другим
+            outgoing = relationships.outgoing(character_name)
+            if not outgoing:
+                return [
+                    discord.Embed(
+                        title="💞 Детальные отношения",
+                        description=f"У {character_name} пока нет отношений.",
+                        color=DETAILS_COLOR,
+                    )
+                ]
+            header = f"Отношения **{character_name}** → другим:\n\n"
+            with_relation = sorted(
+                outgoing.items(), key=lambda item: item[1].value, reverse=True
+            )
+            lines = [
+                f"**{character_name} → {other_char}**: {rel.value} - {rel.description}"
+                for other_char, rel in with_relation
+            ]
+            # Directed: from → to; остальные персонажи — еще без отношения
+            lines += [
+                f"**{character_name} → {other_char}**: Нет отношения"
+                for other_char in system.characters
+                if other_char != character_name and other_char not in outgoing
+            ]
+        else:
+            # Все направленные отношения (from → to)
+            header = "Все отношения (от → к):\n\n"
+            lines = [
+                f"**{from_char} → {to_char}**: {rel.value} - {rel.description}"
+                for (from_char, to_char), rel in sorted(
+                    relationships.items(), key=lambda item: item[1].value, reverse=True
+                )
+            ]
+
+        embeds = [
+            discord.Embed(title="💞 Детальные отношения", description=page, color=DETAILS_COLOR)
+            for page in paginate_lines(lines, header)
+        ]
+        set_page_footers(embeds)
+        return embeds
+
+
+def paginate_lines(lines: Sequence[str], header: str = "", limit: int = PAGE_CHARS) -> List[str]:
+    """Разбить строки на страницы не длиннее limit (заголовок — на каждой странице)"""
+    pages = []
+    current = header
+    for line in lines:
+        line = line[: limit - len(header) - 1]
+        if len(current) + len(line) + 1 > limit and current != header:
+            pages.append(current)
+            current = header
+        current += line + "\n"
+    pages.append(current)
+    return pages
+
+
+def set_page_footers(embeds: List[discord.Embed], text: str = ""):
+    """Подписать номера страниц (если страниц больше одной)"""
+    if len(embeds) == 1:
+        if text:
+            embeds[0].set_footer(text=text)
+        return
+    for number, embed in enumerate(embeds, 1):
+        page = f"Страница {number}/{len(embeds)}"
+        embed.set_footer(text=f"{text} • {page}" if text else page)
+
+
+def _clip(text, limit: int):
+    if text is None or len(text) <= limit:
+        return text
+    return text[: limit - 1] + "…"
+
+
+def fit_embed(embed: discord.Embed) -> discord.Embed:
+    """Обрезать embed под лимиты Discord (поля, описание, общий размер)"""
+    if embed.title:
+        embed.title = _clip(embed.title, EMBED_TITLE_LIMIT)
+    if embed.description:
+        embed.description = _clip(embed.description, EMBED_DESCRIPTION_LIMIT)
+    while len(embed.fields) > EMBED_FIELDS_LIMIT:
+        embed.remove_field(-1)
+    for index, field in enumerate(embed.fields):
+        name = _clip(field.name, EMBED_FIELD_NAME_LIMIT)
+        value = _clip(field.value, EMBED_FIELD_VALUE_LIMIT)
+        if name != field.name or value != field.value:
+            embed.set_field_at(index, name=name, value=value, inline=field.inline)
+    if embed.footer.text and len(embed.footer.text) > EMBED_FOOTER_LIMIT:
+        embed.set_footer(
+            text=_clip(embed.footer.text, EMBED_FOOTER_LIMIT), icon_url=embed.footer.icon_url
+        )
+    # Сверх общего лимита: сначала убираем последние поля, затем режем описание
+    while len(embed) > EMBED_TOTAL_LIMIT and embed.fields:
+        embed.remove_field(-1)
+    excess = len(embed) - EMBED_TOTAL_LIMIT
+    if excess > 0 and embed.description:
+        embed.description = _clip(
+            embed.description, max(1, len(embed.description) - excess - 1)
+        )
+    return embed
+
+
+def group_embeds(embeds: Sequence[discord.Embed]) -> List[List[discord.Embed]]:
+    """Сгруппировать embed по сообщениям: до 10 штук и 6000 символов на сообщение"""
+    messages: List[List[discord.Embed]] = []
+    current: List[discord.Embed] = []
+    size = 0
+    for embed in embeds:
+        embed_size = len(fit_embed(embed))
+        if current and (
+            len(current) >= EMBEDS_PER_MESSAGE or size + embed_size > EMBED_TOTAL_LIMIT
+        ):
+            messages.append(current)
+            current, size = [], 0
+        current.append(embed)
+        size += embed_size
+    if current:
+        messages.append(current)
+    return messages
+
+
+class PageView(discord.ui.View):
+    """Кнопки листания страниц одного сообщения.
+
+    Страницы — готовые группы embed (из кэша Renderer); нажатие кнопки
+    редактирует то же сообщение, поэтому команда отправляет одно сообщение
+    при любом числе страниц. Листать может только автор команды.
+    """
+
+    def __init__(
+        self,
+        pages: Sequence[Sequence[discord.Embed]],
+        author_id: int,
+        timeout: float = PAGINATOR_TIMEOUT,
+    ):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.author_id = author_id
+        self.page = 0
+        self.message: Optional[discord.Message] = None
+        self._update_buttons()
+
+    def _update_buttons(self):
+        first, last = self.page == 0, self.page == len(self.pages) - 1
+        self.first_page.disabled = self.previous_page.disabled = first
+        self.next_page.disabled = self.last_page.disabled = last
+        self.page_number.label = f"{self.page + 1}/{len(self.pages)}"
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message(
+                "❌ Листать страницы может только автор команды.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        self._update_buttons()
+        await interaction.response.edit_message(embeds=list(self.pages[page]), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.primary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.secondary, disabled=True)
+    async def page_number(self, interaction: discord.Interaction, button: discord.ui.Button):
+        pass
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, len(self.pages) - 1)
+
+    async def on_timeout(self):
+        # Кнопки убираются, последняя открытая страница остаётся
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+async def send_embeds(ctx, embeds: Sequence[discord.Embed]):
+    """Отправить страницы одним сообщением (несколько страниц — с кнопками листания)"""
+    pages = group_embeds(embeds)
+    if len(pages) == 1:
+        await ctx.send(embeds=pages[0])
+        return
+    view = PageView(pages, ctx.author.id)
+    view.message = await ctx.send(embeds=pages[0], view=view)
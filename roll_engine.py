@@ -0,0 +1,299 @@
+"""Массовый бросок и переброс отношений.
+
+С NumPy значения хранятся в плотной матрице int8 по порядковым номерам
+персонажей с маской заполненных ячеек, и все недостающие ячейки
+заполняются одним векторным броском. Без NumPy используется обычный цикл.
+
+Правило переброса: новый бросок d10 больше старого значения — значение +1
+(не больше 10); выпала 1 — значение −1 (не меньше 1); иначе без изменений.
+
+Ленивый режим (ROLL_MODE=lazy) не хранит брошенные значения: значение пары
+однозначно выводится из зерна броска и имён пары (derived_value).
+"""
+
+import hashlib
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy — необязательная зависимость
+    np = None
+
+
+class RolledCells:
+    """Ячейки одного броска: номера from и to в names и значения.
+
+    С NumPy это массивы в порядке строк (как их даёт np.nonzero), без него —
+    списки. Потребители берут ячейки группами или целым блоком, не создавая
+    кортеж на каждую ячейку.
+    """
+
+    def __init__(self, names: Sequence[str], rows, cols, values):
+        self.names = names
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _vectorized(self) -> bool:
+        return np is not None and isinstance(self.values, np.ndarray)
+
+    def __iter__(self) -> Iterator[Tuple[str, str, int]]:
+        """Ячейки (from, to, value) по одной"""
+        rows, cols, values = self.rows, self.cols, self.values
+        if self._vectorized():
+            rows, cols, values = rows.tolist(), cols.tolist(), values.tolist()
+        names = self.names
+        for row, col, value in zip(rows, cols, values):
+            yield names[row], names[col], value
+
+    def runs(self, by_target: bool = False) -> Iterator[Tuple[str, List[str], List[int]]]:
+        """Группы (персонаж, [другие персонажи], [значения]) по from или по to"""
+        names = self.names
+        keys, others, values = (
+            (self.cols, self.rows, self.values) if by_target else (self.rows, self.cols, self.values)
+        )
+        if self._vectorized():
+            if by_target:
+                order = np.argsort(keys, kind="stable")
+                keys, others, values = keys[order], others[order], values[order]
+            starts = (np.flatnonzero(np.diff(keys)) + 1).tolist()
+            keys = keys.tolist()
+            others = np.asarray(names, dtype=object)[others].tolist()
+            values = values.tolist()
+        else:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            keys = [keys[number] for number in order]
+            others = [names[others[number]] for number in order]
+            values = [values[number] for number in order]
+            starts = [number for number in range(1, len(keys)) if keys[number] != keys[number - 1]]
+        bounds = [0] + starts + [len(keys)]
+        for start, end in zip(bounds, bounds[1:]):
+            yield names[keys[start]], others[start:end], values[start:end]
+
+    def flat(self) -> List[int]:
+        """Тройки (номер from, номер to, значение) одним плоским списком"""
+        if self._vectorized():
+            return np.stack((self.rows, self.cols, self.values.astype(np.intp)), axis=1).ravel().tolist()
+        return [item for cell in zip(self.rows, self.cols, self.values) for item in cell]
+
+    def block(self) -> Optional["np.ndarray"]:
+        """Матрица значений броска по names (0 — ячейка не бросалась); без NumPy None"""
+        if not self._vectorized():
+            return None
+        size = len(self.names)
+        values = np.zeros((size, size), dtype=np.int8)
+        values[self.rows, self.cols] = self.values
+        return values
+
+
+class ValueMatrix:
+    """Плотная матрица значений отношений (строка — от кого, столбец — к кому)"""
+
+    def __init__(self, capacity: int = 16):
+        self.index: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self._free: List[int] = []
+        self.values = np.zeros((capacity, capacity), dtype=np.int8)
+        self.present = np.zeros((capacity, capacity), dtype=bool)
+
+    def _grow(self, needed: int):
+        capacity = self.values.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        size = self.values.shape[0]
+        values = np.zeros((capacity, capacity), dtype=np.int8)
+        present = np.zeros((capacity, capacity), dtype=bool)
+        values[:size, :size] = self.values
+        present[:size, :size] = self.present
+        self.values, self.present = values, present
+
+    def add(self, name: str) -> int:
+        """Порядковый номер персонажа (выделяется при первом обращении)"""
+        ordinal = self.index.get(name)
+        if ordinal is not None:
+            return ordinal
+        if self._free:
+            ordinal = self._free.pop()
+            self.names[ordinal] = name
+        else:
+            ordinal = len(self.names)
+            self._grow(ordinal + 1)
+            self.names.append(name)
+        self.index[name] = ordinal
+        return ordinal
+
+    def remove(self, name: str):
+        """Освободить номер персонажа вместе со строкой и столбцом"""
+        ordinal = self.index.pop(name, None)
+        if ordinal is None:
+            return
+        self.present[ordinal, :] = False
+        self.present[:, ordinal] = False
+        self.names[ordinal] = None
+        self._free.append(ordinal)
+
+    def set(self, from_char: str, to_char: str, value: int):
+        row, col = self.add(from_char), self.add(to_char)
+        self.values[row, col] = value
+        self.present[row, col] = True
+
+    def set_many(self, cells: Iterable[Tuple[str, str, int]]):
+        """Заполнить ячейки (from, to, value) одним присваиванием"""
+        rows, cols, values = [], [], []
+        for from_char, to_char, value in cells:
+            rows.append(self.add(from_char))
+            cols.append(self.add(to_char))
+            values.append(value)
+        if rows:
+            self.values[rows, cols] = values
+            self.present[rows, cols] = True
+
+    def roll_missing(
+        self, characters: Sequence[str], rng, covered: Optional[Sequence[bool]] = None
+    ) -> RolledCells:
+        """Заполнить все пустые ячейки между characters одним броском.
+
+        covered — отметки персонажей с ленивым броском: пары двух таких
+        персонажей уже имеют значения.
+        """
+        ordinals = np.fromiter(
+            (self.add(name) for name in characters), dtype=np.intp, count=len(characters)
+        )
+        missing = ~self.present[np.ix_(ordinals, ordinals)]
+        np.fill_diagonal(missing, False)  # No self-relation
+        if covered is not None:
+            mask = np.asarray(covered, dtype=bool)
+            missing &= ~np.outer(mask, mask)
+        rows, cols = np.nonzero(missing)
+        values = rng.integers(1, 11, size=len(rows), dtype=np.int8)
+        self.values[ordinals[rows], ordinals[cols]] = values
+        self.present[ordinals[rows], ordinals[cols]] = True
+        return RolledCells(characters, rows, cols, values)
+
+
+MASK64 = (1 << 64) - 1
+
+
+def new_seed() -> int:
+    """Зерно ленивого броска"""
+    return random.getrandbits(63)
+
+
+def name_key(name: str) -> int:
+    """Стабильный между запусками 64-битный ключ имени (hash() зависит от процесса)"""
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def derived_value(seed: int, from_key: int, to_key: int) -> int:
+    """Значение 1–10 направленной пары, заданное зерном и ключами имён.
+
+    Ключи смешиваются с разными множителями (from → to и to → from
+    независимы) и перемешиваются финализатором splitmix64.
+    """
+    x = (seed + from_key * 0x9E3779B97F4A7C15 + to_key * 0xD1B54A32D192ED03) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return (x ^ (x >> 31)) % 10 + 1
+
+
+def derived_matrix(
+    seeds: Sequence[int], ranks: Sequence[int], keys: Sequence[int]
+) -> Optional["np.ndarray"]:
+    """Значения derived_value всех пар персонажей одним векторным проходом.
+
+    Для каждого персонажа — зерно и номер его броска и ключ имени; значение
+    пары берётся из зерна более позднего броска. Строка — от кого, столбец —
+    к кому, диагональ 0. Без NumPy возвращает None.
+    """
+    if np is None:
+        return None
+    seeds = np.asarray(seeds, dtype=np.uint64)
+    ranks = np.asarray(ranks, dtype=np.int64)
+    keys = np.asarray(keys, dtype=np.uint64)
+    size = len(keys)
+    values = np.zeros((size, size), dtype=np.int8)
+    to_part = keys * np.uint64(0xD1B54A32D192ED03)
+    # По блокам строк, чтобы временные массивы uint64 не занимали k² × 8 байт
+    for start in range(0, size, 256):
+        rows = slice(start, start + 256)
+        later = ranks[rows, None] > ranks[None, :]
+        x = np.where(later, seeds[rows, None], seeds[None, :])
+        x += (keys[rows] * np.uint64(0x9E3779B97F4A7C15))[:, None]
+        x += to_part[None, :]
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        values[rows] = (x ^ (x >> np.uint64(31))) % np.uint64(10) + np.uint64(1)
+    np.fill_diagonal(values, 0)
+    return values
+
+
+def adjust_value(old_value: int, new_roll: int) -> int:
+    """Значение после переброса по правилу корректировки"""
+    if new_roll > old_value:
+        return min(10, old_value + 1)  # Увеличиваем на 1, макс 10
+    if new_roll == 1:
+        return max(1, old_value - 1)  # Уменьшаем на 1, мин 1
+    return old_value
+
+
+class RollEngine:
+    """Бросок недостающих отношений (векторный при наличии NumPy)"""
+
+    def __init__(self):
+        if np is not None:
+            self.matrix: Optional[ValueMatrix] = ValueMatrix()
+            self._rng = np.random.default_rng()
+        else:
+            self.matrix = None
+
+    def on_character_removed(self, name: str):
+        if self.matrix is not None:
+            self.matrix.remove(name)
+
+    def on_set(self, from_char: str, to_char: str, value: int):
+        if self.matrix is not None:
+            self.matrix.set(from_char, to_char, value)
+
+    def load(self, cells: Iterable[Tuple[str, str, int]]):
+        """Учесть загруженные ячейки (from, to, value)"""
+        if self.matrix is not None:
+            self.matrix.set_many(cells)
+
+    def reroll(self, old_values: Sequence[int]) -> Tuple[List[int], List[int]]:
+        """Переброс значений одним проходом, вернуть (броски, новые значения)"""
+        if self.matrix is not None and old_values:
+            old = np.asarray(old_values, dtype=np.int8)
+            rolls = self._rng.integers(1, 11, size=len(old), dtype=np.int8)
+            new = np.where(
+                rolls > old,
+                np.minimum(old + 1, 10),
+                np.where(rolls == 1, np.maximum(old - 1, 1), old),
+            )
+            return rolls.tolist(), new.tolist()
+
+        rolls = [random.randint(1, 10) for _ in old_values]
+        return rolls, [adjust_value(old, roll) for old, roll in zip(old_values, rolls)]
+
+    def roll_missing(self, characters: Sequence[str], graph) -> RolledCells:
+        """Значения для всех отсутствующих направленных пар между characters"""
+        if self.matrix is not None:
+            covered = [graph.covered(name) for name in characters]
+            return self.matrix.roll_missing(
+                characters, self._rng, covered if any(covered) else None
+            )
+
+        rows, cols, values = [], [], []
+        for row, char1 in enumerate(characters):
+            outgoing = graph.outgoing(char1)
+            for col, char2 in enumerate(characters):
+                if char1 != char2 and char2 not in outgoing:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(random.randint(1, 10))
+        return RolledCells(characters, rows, cols, values)
@@ -0,0 +1,619 @@
+"""Хранилища данных системы отношений.
+
+Бэкенд выбирается переменной STORAGE_BACKEND в .env (рядом с DISCORD_TOKEN):
+  json   — characters.json + relationships.json (по умолчанию)
+  sqlite — база SQLite в режиме WAL
+
+Данные каждого сервера хранятся отдельно: DATA_DIR/<guild_id>/ (по умолчанию
+data/). Старые общие файлы в корне читаются для сервера LEGACY_GUILD_ID;
+если он не задан, при запуске выводится предупреждение.
+
+JSON хранилище ведёт журнал изменений (journal.jsonl рядом с данными) и
+переписывает файлы целиком только при сжатии журнала в снимок: когда журнал
+больше JOURNAL_MAX_KB или старше JOURNAL_MAX_AGE секунд. JSON_JOURNAL=0
+отключает журнал.
+
+Несколько процессов (кластеры шардов, см. launcher.py) могут работать с
+одними данными: JSON файлы сервера читаются и пишутся под рекомендательной
+блокировкой DATA_DIR/<guild_id>/.storage.lock, SQLite использует собственные
+блокировки. changed_externally() сообщает, что данные изменил другой
+процесс, и сервер перечитывается.
+
+Перенос существующих JSON данных (со снимком и журналом) в SQLite:
+  python storage.py migrate [--guild ID ...]   # базы DATA_DIR/<guild_id>/relationships.db
+  python storage.py migrate --characters F --relationships F [--db F]
+Без аргументов переносятся все серверы из DATA_DIR и сервер LEGACY_GUILD_ID.
+"""
+
+import argparse
+import ast
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from journal import Journal
+from persistence import FileLock, atomic_write_json
+
+Pair = Tuple[str, str]
+
+
+def parse_pair_key(rel_key: str) -> Optional[Pair]:
+    """Разбор ключа вида "('A', 'B')" из relationships.json"""
+    try:
+        pair = ast.literal_eval(rel_key)
+    except (ValueError, SyntaxError):
+        return None
+    if (
+        isinstance(pair, tuple)
+        and len(pair) == 2
+        and all(isinstance(char, str) for char in pair)
+    ):
+        return pair
+    return None
+
+
+def format_pair_key(from_char: str, to_char: str) -> str:
+    """Ключ отношения в формате relationships.json: str((from, to))"""
+    return str((from_char, to_char))
+
+
+def iter_json_relationships(raw: Dict[str, dict]) -> Iterator[Tuple[Pair, dict]]:
+    """Отношения из формата relationships.json в виде ((from, to), data)"""
+    for rel_key, data in raw.items():
+        pair = parse_pair_key(rel_key)
+        if pair is None:
+            print(f"⚠️ Пропущен некорректный ключ отношения: {rel_key!r}")
+            continue
+        yield pair, data
+
+
+class ChangeSet:
+    """Накопленные с последнего сохранения изменения (для построчной записи)"""
+
+    def __init__(self):
+        self.characters: Dict[str, dict] = {}
+        # Записи отношений (с .value и .to_dict()); None — удалено
+        self.relationships: Dict[Pair, Optional[object]] = {}
+        self.removed_characters: Set[str] = set()
+        # Операции для журнала в порядке выполнения
+        self.ops: List[dict] = []
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.characters or self.relationships or self.removed_characters or self.ops
+        )
+
+    def record(self, op: dict):
+        self.ops.append(op)
+
+    def add_character(self, name: str, data: dict):
+        self.characters[name] = data
+
+    def remove_character(self, name: str):
+        self.characters.pop(name, None)
+        self.removed_characters.add(name)
+        # Отложенные изменения отношений персонажа поглощаются удалением
+        for pair in [p for p in self.relationships if name in p]:
+            del self.relationships[pair]
+
+    def set_relationship(self, pair: Pair, data: Optional[dict]):
+        self.relationships[pair] = data
+
+    def set_relationships(self, items: Iterable[Tuple[Pair, object]]):
+        self.relationships.update(items)
+
+    def merge(self, newer: "ChangeSet"):
+        """Применить более поздние изменения поверх текущих"""
+        for name in newer.removed_characters:
+            self.remove_character(name)
+        self.characters.update(newer.characters)
+        self.relationships.update(newer.relationships)
+        self.ops.extend(newer.ops)
+
+
+class StorageBackend:
+    """Интерфейс хранилища.
+
+    snapshot() вызывается в цикле событий и должен быть быстрым, write()
+    выполняется в рабочем потоке отложенного сохранения.
+    """
+
+    name = "base"
+    # Объём данных, прочитанных последним load() (для метрик), байт
+    last_load_bytes = 0
+    # Читает ли snapshot() изменённые строки ChangeSet (а не только операции)
+    row_changes = True
+
+    def load(self) -> Tuple[Dict[str, dict], Iterable[Tuple[Pair, dict]]]:
+        """Загрузить персонажей и отношения ((from, to), data)"""
+        raise NotImplementedError
+
+    def snapshot(self, characters: dict, relationships, changes: ChangeSet):
+        """Снять данные для записи (relationships — RelationshipGraph)"""
+        raise NotImplementedError
+
+    def write(self, snapshot) -> int:
+        """Записать снимок, вернуть число записанных байт"""
+        raise NotImplementedError
+
+    def changed_externally(self) -> bool:
+        """Изменил ли данные другой процесс после нашей загрузки/записи"""
+        return False
+
+    def close(self):
+        pass
+
+
+class JsonStorage(StorageBackend):
+    """Снимок из двух JSON файлов и (опционально) журнал изменений.
+
+    Без журнала каждое сохранение переписывает оба файла целиком.
+    """
+
+    name = "json"
+    # Пишутся снимки графа и операции журнала, строки ChangeSet не нужны
+    row_changes = False
+
+    def __init__(
+        self,
+        characters_file: str = "characters.json",
+        relationships_file: str = "relationships.json",
+        legacy_files: Optional[Tuple[str, str]] = None,
+        journal: Optional[Journal] = None,
+        journal_max_bytes: int = 1024 * 1024,
+        journal_max_age: float = 600.0,
+    ):
+        self.characters_file = characters_file
+        self.relationships_file = relationships_file
+        # Старые файлы читаются, пока новые ещё не созданы; запись — только в новые
+        self.legacy_files = legacy_files
+        self.journal = journal
+        self.journal_max_bytes = journal_max_bytes
+        self.journal_max_age = journal_max_age
+        self._force_snapshot = False
+        # Операции, не попавшие в журнал из-за ошибки записи (допишутся следующими)
+        self._unjournaled: List[dict] = []
+        self._lock = FileLock(
+            os.path.join(os.path.dirname(characters_file) or ".", ".storage.lock")
+        )
+        # Состояние файлов после нашей последней загрузки/записи
+        self._seen: Optional[tuple] = None
+        self._writing = False
+        self.stale = False
+
+    def _signature(self) -> tuple:
+        paths = [self.characters_file, self.relationships_file]
+        if self.journal is not None:
+            paths.append(self.journal.path)
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def changed_externally(self) -> bool:
+        if self.stale:
+            return True
+        if self._writing or self._seen is None:
+            return False
+        return self._signature() != self._seen
+
+    def _read(self, path: str) -> dict:
+        try:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    payload = f.read()
+                self.last_load_bytes += len(payload)
+                return json.loads(payload.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError, IOError) as e:
+            print(f"⚠️ Ошибка загрузки {os.path.basename(path)}: {e}")
+        return {}
+
+    def load(self):
+        with self._lock:
+            loaded = self._load()
+            self._seen = self._signature()
+            self.stale = False
+            return loaded
+
+    def _load(self):
+        characters_file, relationships_file = self.characters_file, self.relationships_file
+        if (
+            self.legacy_files
+            and not os.path.exists(characters_file)
+            and not os.path.exists(relationships_file)
+        ):
+            characters_file, relationships_file = self.legacy_files
+        self.last_load_bytes = 0
+        characters = self._read(characters_file)
+        relationships = self._read(relationships_file)
+        if self.journal is None:
+            return characters, iter_json_relationships(relationships)
+
+        relationships = dict(iter_json_relationships(relationships))
+        self.journal.sync()
+        self.last_load_bytes += self.journal.size
+        replayed = self.journal.replay(characters, relationships)
+        if replayed:
+            print(f"📜 Применено {replayed} записей журнала {self.journal.path}")
+        return characters, relationships.items()
+
+    def _compaction_due(self) -> bool:
+        journal = self.journal
+        return (
+            self._force_snapshot
+            or journal.size >= self.journal_max_bytes
+            or (journal.size and journal.age() >= self.journal_max_age)
+        )
+
+    def snapshot(self, characters, relationships, changes):
+        if self.journal is not None and not self._compaction_due():
+            return "journal", changes.ops
+        # Записи отношений неизменяемы: в поток передаются ссылки на них
+        return "snapshot", dict(characters), list(relationships.stored_items()), changes.ops
+
+    def write(self, snapshot):
+        self._writing = True
+        try:
+            with self._lock:
+                try:
+                    if self._seen is not None and self._signature() != self._seen:
+                        return self._write_over_external(snapshot)
+                    return self._write(snapshot)
+                finally:
+                    # Наша запись (даже частичная) — не изменение другим процессом
+                    self._seen = self._signature()
+        finally:
+            self._writing = False
+
+    def _write_over_external(self, snapshot) -> int:
+        """Данные изменил другой процесс: снимок из памяти затёр бы его изменения"""
+        self.stale = True  # Сервер будет перечитан
+        ops = snapshot[1] if snapshot[0] == "journal" else snapshot[3]
+        if self.journal is not None:
+            # Операции журнала задают итоговые значения и ложатся поверх чужих
+            print(f"⚠️ {self.journal.path}: данные изменены другим процессом, дописываем журнал")
+            self.journal.sync()
+            return self._append(ops)
+        print(
+            f"⚠️ {self.characters_file}: данные изменены другим процессом, "
+            "без журнала сохраняется наша версия"
+        )
+        return self._write(snapshot)
+
+    def _append(self, ops: List[dict]) -> int:
+        """Дописать операции в журнал вместе с не записанными в прошлый раз"""
+        ops = self._unjournaled + ops
+        try:
+            written = self.journal.append(ops)
+        except OSError:
+            # Операции уже изъяты из ChangeSet — следующая запись будет полным снимком
+            self._unjournaled = ops
+            self._force_snapshot = True
+            raise
+        self._unjournaled = []
+        return written
+
+    def _write(self, snapshot) -> int:
+        if snapshot[0] == "journal":
+            return self._append(snapshot[1])
+
+        _, characters, items, ops = snapshot
+        relationships = {
+            format_pair_key(from_char, to_char): data.to_dict()
+            for (from_char, to_char), data in items
+        }
+        written = 0
+        if self.journal is not None:
+            # Операции снимка сначала попадают в журнал: при сбое до ротации
+            # весь журнал повторяется поверх снимка и даёт то же состояние
+            # (иначе старые операции, например добавление удалённого, ожили бы)
+            written += self._append(ops)
+        error: Optional[IOError] = None
+        try:
+            written += atomic_write_json(self.characters_file, characters)
+        except IOError as e:
+            print(f"⚠️ Ошибка сохранения {os.path.basename(self.characters_file)}: {e}")
+            error = e
+
+        try:
+            written += atomic_write_json(self.relationships_file, relationships)
+        except IOError as e:
+            print(
+                f"⚠️ Ошибка сохранения {os.path.basename(self.relationships_file)}: {e}"
+            )
+            error = error or e
+
+        if error is not None:
+            # Операции уже изъяты из ChangeSet и не попали в журнал: следующая
+            # запись — полный снимок, а исключение оставляет данные грязными
+            self._force_snapshot = True
+            raise error
+        if self.journal is not None:
+            # Снимок включает всё из журнала — журнал уходит в архив
+            self.journal.rotate()
+        self._force_snapshot = False
+        return written
+
+
+class SqliteStorage(StorageBackend):
+    """SQLite в режиме WAL: сохраняются только изменённые строки"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS characters (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS relationships (
+            from_char TEXT NOT NULL,
+            to_char TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (from_char, to_char)
+        );
+        CREATE INDEX IF NOT EXISTS idx_relationships_to ON relationships (to_char);
+    """
+
+    def __init__(self, path: str = "relationships.db"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Соединение используется из рабочих потоков, доступ под self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # База может быть открыта несколькими процессами — ждём их транзакции
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+        self._retry: Optional[ChangeSet] = None
+        self._data_version: Optional[int] = None
+
+    def _current_data_version(self) -> int:
+        # Меняется только после фиксации транзакций других соединений
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_externally(self) -> bool:
+        # Пока идёт наша запись, не ждём её в цикле событий
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            return (
+                self._data_version is not None
+                and self._current_data_version() != self._data_version
+            )
+        finally:
+            self._lock.release()
+
+    def load(self):
+        loaded = 0
+        characters = {}
+        relationships = []
+        with self._lock, self._conn:
+            # Одна читающая транзакция: другой процесс не вклинится между таблицами
+            self._conn.execute("BEGIN")
+            for name, data in self._conn.execute("SELECT name, data FROM characters"):
+                loaded += len(data)
+                characters[name] = json.loads(data)
+            for from_char, to_char, data in self._conn.execute(
+                "SELECT from_char, to_char, data FROM relationships"
+            ):
+                loaded += len(data)
+                relationships.append(((from_char, to_char), json.loads(data)))
+            self._data_version = self._current_data_version()
+        self.last_load_bytes = loaded
+        return characters, relationships
+
+    def snapshot(self, characters, relationships, changes):
+        # Изменения, не записанные из-за ошибки, повторяются первыми
+        if self._retry is not None:
+            retry, self._retry = self._retry, None
+            retry.merge(changes)
+            return retry
+        return changes
+
+    def write(self, changes: ChangeSet) -> int:
+        try:
+            return self.apply(changes)
+        except sqlite3.Error:
+            self._retry = changes
+            raise
+
+    def apply(self, changes: ChangeSet) -> int:
+        """Применить изменения одной транзакцией, вернуть объём записанных данных"""
+        characters = [
+            (name, json.dumps(data, ensure_ascii=False))
+            for name, data in changes.characters.items()
+        ]
+        relationships = [
+            (
+                from_char,
+                to_char,
+                data.value,
+                json.dumps(data.to_dict(), ensure_ascii=False),
+            )
+            for (from_char, to_char), data in changes.relationships.items()
+            if data is not None
+        ]
+        removed = [pair for pair, data in changes.relationships.items() if data is None]
+        with self._lock, self._conn:
+            for name in changes.removed_characters:
+                self._conn.execute("DELETE FROM characters WHERE name = ?", (name,))
+                self._conn.execute(
+                    "DELETE FROM relationships WHERE from_char = ? OR to_char = ?",
+                    (name, name),
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO characters (name, data) VALUES (?, ?)",
+                characters,
+            )
+            self._conn.executemany(
+                "DELETE FROM relationships WHERE from_char = ? AND to_char = ?", removed
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO relationships (from_char, to_char, value, data) "
+                "VALUES (?, ?, ?, ?)",
+                relationships,
+            )
+        return sum(len(row[-1]) for row in characters) + sum(
+            len(row[-1]) for row in relationships
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Старые общие файлы (до разделения данных по серверам)
+LEGACY_FILES = ("characters.json", "relationships.json")
+
+
+def guild_data_dir(guild_id: int) -> str:
+    """Каталог данных сервера"""
+    return os.path.join(os.getenv("DATA_DIR", "data"), str(guild_id))
+
+
+def has_guild_data(guild_id: int) -> bool:
+    """Есть ли у сервера сохранённые данные (каталог или старые общие файлы)"""
+    return os.path.isdir(guild_data_dir(guild_id)) or os.getenv(
+        "LEGACY_GUILD_ID"
+    ) == str(guild_id)
+
+
+def warn_unclaimed_legacy_files() -> bool:
+    """Предупредить, что старые общие файлы есть, а LEGACY_GUILD_ID не задан.
+
+    Без него файлы не читаются ни одним сервером, и после обновления все
+    серверы начинают с пустыми данными.
+    """
+    if os.getenv("LEGACY_GUILD_ID", "").strip():
+        return False
+    found = [path for path in LEGACY_FILES if os.path.exists(path)]
+    if not found:
+        return False
+    print(
+        f"⚠️ Найдены старые общие файлы ({', '.join(found)}), но LEGACY_GUILD_ID не задан: "
+        "их данные не загружаются. Укажите в .env ID сервера, которому они принадлежат"
+    )
+    return True
+
+
+def create_storage(guild_id: Optional[int] = None, backend: Optional[str] = None) -> StorageBackend:
+    """Хранилище по настройке STORAGE_BACKEND из .env (или явному backend).
+
+    Без guild_id используются старые общие файлы в текущем каталоге.
+    """
+    backend = (backend or os.getenv("STORAGE_BACKEND", "json")).strip().lower()
+    if backend not in ("json", "sqlite"):
+        print(f"⚠️ Неизвестный STORAGE_BACKEND={backend!r}, используется json")
+        backend = "json"
+
+    if guild_id is None:
+        if backend == "sqlite":
+            return SqliteStorage(os.getenv("SQLITE_PATH", "relationships.db"))
+        return JsonStorage()
+
+    directory = guild_data_dir(guild_id)
+    if backend == "sqlite":
+        return SqliteStorage(os.path.join(directory, "relationships.db"))
+    legacy_files = None
+    if os.getenv("LEGACY_GUILD_ID") == str(guild_id):
+        legacy_files = LEGACY_FILES
+    journal = None
+    if os.getenv("JSON_JOURNAL", "1") != "0":
+        journal = Journal(
+            os.path.join(directory, "journal.jsonl"),
+            keep_archives=int(os.getenv("JOURNAL_ARCHIVES", "10")),
+        )
+    return JsonStorage(
+        os.path.join(directory, "characters.json"),
+        os.path.join(directory, "relationships.json"),
+        legacy_files=legacy_files,
+        journal=journal,
+        journal_max_bytes=int(float(os.getenv("JOURNAL_MAX_KB", "1024")) * 1024),
+        journal_max_age=float(os.getenv("JOURNAL_MAX_AGE", "600")),
+    )
+
+
+def migrate_json_to_sqlite(source: "JsonStorage", db_path: str) -> Tuple[int, int]:
+    """Однократный импорт JSON данных в SQLite, возвращает (персонажей, отношений).
+
+    source загружается как при работе бота: снимок и поверх него журнал.
+    """
+    from Relationship_System import Relationship
+
+    characters, relationships = source.load()
+    changes = ChangeSet()
+    for name, data in characters.items():
+        changes.add_character(name, data)
+    batches = {}
+    for pair, data in relationships:
+        changes.set_relationship(pair, Relationship.from_dict(data, batches))
+
+    storage = SqliteStorage(db_path)
+    try:
+        storage.apply(changes)
+    finally:
+        storage.close()
+    return len(changes.characters), len(changes.relationships)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Хранилище системы отношений")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Импорт JSON данных в SQLite")
+    migrate.add_argument(
+        "--guild",
+        type=int,
+        action="append",
+        help="Сервер (DATA_DIR/<guild>/), можно несколько; по умолчанию — все",
+    )
+    migrate.add_argument("--characters", help="Отдельные JSON файлы вместо данных сервера")
+    migrate.add_argument("--relationships")
+    migrate.add_argument("--db", default=os.getenv("SQLITE_PATH", "relationships.db"))
+    args = parser.parse_args()
+
+    if args.command != "migrate":
+        return
+    if args.characters or args.relationships:
+        source = JsonStorage(
+            args.characters or "characters.json",
+            args.relationships or "relationships.json",
+        )
+        chars, rels = migrate_json_to_sqlite(source, args.db)
+        print(f"✅ Перенесено в {args.db}: {chars} персонажей, {rels} отношений")
+        return
+
+    guild_ids = args.guild
+    if not guild_ids:
+        data_dir = os.getenv("DATA_DIR", "data")
+        guild_ids = sorted(
+            int(entry)
+            for entry in (os.listdir(data_dir) if os.path.isdir(data_dir) else ())
+            if entry.isdigit()
+        )
+        legacy = os.getenv("LEGACY_GUILD_ID")
+        if legacy and legacy.isdigit() and int(legacy) not in guild_ids:
+            guild_ids.append(int(legacy))
+    if not guild_ids:
+        print("⚠️ Нет данных серверов для переноса")
+    for guild_id in guild_ids:
+        # Та же база, которую откроет бот с STORAGE_BACKEND=sqlite
+        db_path = os.path.join(guild_data_dir(guild_id), "relationships.db")
+        chars, rels = migrate_json_to_sqlite(create_storage(guild_id, backend="json"), db_path)
+        print(f"✅ Сервер {guild_id} → {db_path}: {chars} персонажей, {rels} отношений")
+
+
+if __name__ == "__main__":
+    main()
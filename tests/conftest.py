@@ -0,0 +1,96 @@
+"""Общие настройки тестов: модули бота лежат в корне репозитория"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATE = "2025-01-01T00:00:00+00:00"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Отдельная папка данных на тест и хранилище по умолчанию (JSON с журналом)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("SAVE_DELAY", "0.01")
+    for name in (
+        "STORAGE_BACKEND",
+        "ROLL_MODE",
+        "JSON_JOURNAL",
+        "JOURNAL_MAX_KB",
+        "JOURNAL_MAX_AGE",
+        "LEGACY_GUILD_ID",
+        "SQLITE_PATH",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path / "data"
+
+
+def open_system(guild_id: int = 1):
+    """Система сервера, заново прочитанная из хранилища («перезапуск»)"""
+    from Relationship_System import RelationshipSystem
+    from storage import create_storage
+
+    return RelationshipSystem(create_storage(guild_id))
+
+
+def state(system):
+    """Всё, что видно командам: персонажи и отношения с бросками"""
+    relationships = {
+        pair: (
+            data.value,
+            data.roll.by,
+            data.roll.date,
+            data.reroll.date if data.reroll is not None else None,
+        )
+        for pair, data in system.relationships.items()
+    }
+    return dict(system.characters), relationships
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def vectorized(request, monkeypatch):
+    """С NumPy и без него (векторные и построчные пути дают одно и то же)"""
+    if request.param:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr("roll_engine.np", None)
+        monkeypatch.setattr("analytics.np", None)
+    return request.param
+
+
+def assert_consistent(graph):
+    """Индексы и агрегаты графа совпадают с пересчётом по всем отношениям"""
+    items = {pair: data.value for pair, data in graph.items()}
+    assert len(items) == len(graph)
+    for (from_char, to_char), value in items.items():
+        assert graph.get(from_char, to_char).value == value
+        assert graph.outgoing(from_char)[to_char].value == value
+        assert graph.incoming(to_char)[from_char].value == value
+
+    stats = graph.stats
+    assert stats.total.count == len(items)
+    assert stats.total.total == sum(items.values())
+    assert set(stats.incoming) == {to_char for _, to_char in items}
+    assert set(stats.outgoing) == {from_char for from_char, _ in items}
+    for name, aggregate in stats.incoming.items():
+        values = [value for (_, to_char), value in items.items() if to_char == name]
+        assert (aggregate.count, aggregate.total) == (len(values), sum(values))
+        assert (aggregate.min, aggregate.max) == (min(values), max(values))
+        best, admirers = stats.favorite(name)
+        assert best == max(values)
+        assert admirers == sorted(
+            from_char for (from_char, to_char), value in items.items()
+            if to_char == name and value == best
+        )
+    for name, aggregate in stats.outgoing.items():
+        values = [value for (from_char, _), value in items.items() if from_char == name]
+        assert (aggregate.count, aggregate.total) == (len(values), sum(values))
+    assert stats.mutual_love == {
+        tuple(sorted(pair))
+        for pair, value in items.items()
+        if value >= 9 and items.get(pair[::-1], 0) >= 9
+    }
@@ -0,0 +1,76 @@
+"""Массовые операции: списки имён, разбор импорта и экспорт обратно"""
+
+import json
+
+import bulk
+from conftest import DATE, open_system
+
+
+def test_split_names_drops_blanks_and_repeats():
+    text = "Алиса, Борис;\nВера\n\n , Алиса;Гоша "
+    assert bulk.split_names(text) == ["Алиса", "Борис", "Вера", "Гоша"]
+    assert bulk.split_names(" ,;\n") == []
+
+
+def test_parse_import_csv_names_and_relationships():
+    files = [
+        ("characters.csv", "\ufeffname\nАлиса\n Борис \nАлиса\n".encode()),
+        ("relationships.csv", "from,to,value,rolled_by\nАлиса,Борис,7,42\nБорис,Вера,3,\n".encode()),
+    ]
+    result = bulk.parse_import(files, {"Вера"})
+    assert result.errors == []
+    assert result.characters == ["Алиса", "Борис"]
+    assert result.relationships == {
+        ("Алиса", "Борис"): {"value": 7, "rolled_by": 42},
+        ("Борис", "Вера"): {"value": 3},
+    }
+
+
+def test_parse_import_reports_every_problem():
+    files = [
+        ("relationships.csv", "from,to,value\nА,Б,11\nА,А,5\nА,Б,x\n,Б,4\nА,Г,2\n".encode()),
+        ("data.json", b"[1, 2]"),
+        ("broken.json", b"{"),
+        ("notes.txt", b""),
+        ("other.csv", b"who\n1\n"),
+    ]
+    errors = bulk.parse_import(files, {"А", "Б"}).errors
+    assert len(errors) == 9
+    assert "relationships.csv:2: значение 11 вне диапазона 1–10" in errors
+    assert "relationships.csv:3: отношение к себе `А`" in errors
+    assert "relationships.csv:4: значение `x` не число" in errors
+    assert "relationships.csv:5: пустое имя" in errors
+    assert "Персонаж `Г` из отношений не найден" in errors
+    assert "notes.txt: поддерживаются только .json и .csv" in errors
+
+
+def test_export_json_imports_back(data_dir):
+    system = open_system()
+    system.add_characters(["Алиса", "Борис", "Вера"], 1, DATE)
+    system.roll_missing(1, DATE)
+    payload = bulk.export_json(system.characters, system.relationships.items())
+
+    result = bulk.parse_import([("export.json", payload)], ())
+    assert result.errors == []
+    assert sorted(result.characters) == ["Алиса", "Борис", "Вера"]
+    exported = json.loads(payload)["relationships"]
+    assert len(result.relationships) == len(exported) == 6
+    for (from_char, to_char), data in result.relationships.items():
+        assert data["value"] == system.relationships.get(from_char, to_char).value
+
+
+def test_export_csv_imports_back(data_dir):
+    system = open_system()
+    system.add_characters(["Алиса", "Борис"], 1, DATE)
+    system.roll_missing(1, DATE)
+    characters, relationships = bulk.export_csv(system.characters, system.relationships.items())
+
+    result = bulk.parse_import(
+        [("characters.csv", characters), ("relationships.csv", relationships)], ()
+    )
+    assert result.errors == []
+    assert result.characters == ["Алиса", "Борис"]
+    assert {pair: data["value"] for pair, data in result.relationships.items()} == {
+        pair: data.value for pair, data in system.relationships.items()
+    }
+    assert result.relationships["Алиса", "Борис"]["rolled_by"] == 1
@@ -0,0 +1,126 @@
+"""Журнал JSON хранилища: снимок + журнал дают то же состояние после перезапуска"""
+
+import os
+import shutil
+
+from conftest import DATE, open_system, state
+
+LATER = "2025-02-01T00:00:00+00:00"
+
+
+def fill(system):
+    system.add_characters(["Алиса", "Борис", "Вера", "Гоша"], 1, DATE)
+    system.roll_missing(1, DATE)
+    system.reroll([("Алиса", "Борис"), ("Вера", "Гоша")], 2, LATER)
+    system.remove_character("Гоша", 1)
+    system.add_character("Дина", 3, LATER)
+    system.roll_missing(3, LATER)
+
+
+def test_journal_replayed_after_restart(data_dir):
+    system = open_system()
+    fill(system)
+    system.save_data()
+    assert os.path.exists(data_dir / "1" / "journal.jsonl")
+    assert not os.path.exists(data_dir / "1" / "relationships.json")
+
+    assert state(open_system()) == state(system)
+
+
+def test_journal_on_top_of_snapshot(data_dir, monkeypatch):
+    # Первая запись — полный снимок, следующие — журнал поверх него
+    monkeypatch.setenv("JOURNAL_MAX_KB", "0")
+    system = open_system()
+    system.add_characters(["Алиса", "Борис", "Вера"], 1, DATE)
+    system.roll_missing(1, DATE)
+    system.save_data()
+    assert os.path.exists(data_dir / "1" / "relationships.json")
+    assert not os.path.exists(data_dir / "1" / "journal.jsonl")
+
+    monkeypatch.delenv("JOURNAL_MAX_KB")
+    system = open_system()
+    system.reroll([("Алиса", "Борис")], 2, LATER)
+    system.remove_character("Вера", 2)
+    system.add_character("Гоша", 2, LATER)
+    system.roll_missing(2, LATER)
+    system.save_data()
+    assert os.path.exists(data_dir / "1" / "journal.jsonl")
+
+    restarted = open_system()
+    assert state(restarted) == state(system)
+    # И после ещё одного перезапуска без изменений
+    assert state(open_system()) == state(system)
+
+
+def test_crash_before_journal_rotation(data_dir, monkeypatch):
+    """Снимок записан, а журнал ещё не убран в архив: повтор журнала безопасен"""
+    system = open_system()
+    system.add_characters(["Алиса", "Борис", "Вера"], 1, DATE)
+    system.roll_missing(1, DATE)
+    system.save_data()
+    journal = data_dir / "1" / "journal.jsonl"
+
+    monkeypatch.setenv("JOURNAL_MAX_KB", "0")
+    system = open_system()
+    system.remove_character("Вера", 2)
+    system.reroll([("Алиса", "Борис")], 2, LATER)
+    unrotated = data_dir / "unrotated.jsonl"
+    original_rotate = system.storage.journal.rotate
+
+    def crash_before_rotate():
+        shutil.copy(journal, unrotated)
+        original_rotate()
+
+    monkeypatch.setattr(system.storage.journal, "rotate", crash_before_rotate)
+    system.save_data()
+    shutil.copy(unrotated, journal)
+
+    monkeypatch.delenv("JOURNAL_MAX_KB")
+    restarted = open_system()
+    assert "Вера" not in restarted.characters
+    assert state(restarted) == state(system)
+
+
+def test_failed_snapshot_is_retried(data_dir, monkeypatch):
+    import storage
+
+    monkeypatch.setenv("JOURNAL_MAX_KB", "0")
+    system = open_system()
+    system.add_characters(["Алиса", "Борис"], 1, DATE)
+    real_write = storage.atomic_write_json
+
+    def disk_full(path, data, indent=2):
+        raise IOError("disk full")
+
+    monkeypatch.setattr(storage, "atomic_write_json", disk_full)
+    snapshot = system._snapshot()
+    try:
+        system._write(snapshot)
+    except IOError:
+        pass
+    else:
+        raise AssertionError("ошибка записи снимка должна передаваться дальше")
+
+    monkeypatch.setattr(storage, "atomic_write_json", real_write)
+    system.roll_missing(1, DATE)
+    system.save_data()
+    assert state(open_system()) == state(system)
+
+
+def test_append_after_torn_last_line(data_dir):
+    """Сбой посреди записи: следующая операция не склеивается с обрывком строки"""
+    system = open_system()
+    system.add_characters(["Алиса", "Борис", "Вера"], 1, DATE)
+    system.save_data()
+    journal = data_dir / "1" / "journal.jsonl"
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","name":"Обрыв"')
+
+    system = open_system()
+    system.add_character("Дина", 2, LATER)
+    system.save_data()
+
+    restarted = open_system()
+    assert "Дина" in restarted.characters
+    assert "Обрыв" not in restarted.characters
+    assert state(restarted) == state(system)
@@ -0,0 +1,87 @@
+"""Ленивые броски (ROLL_MODE=lazy): перезагрузка, аналитика и оценка памяти"""
+
+import pytest
+
+from conftest import DATE, assert_consistent, open_system, state
+
+LATER = "2025-02-01T00:00:00+00:00"
+LAST = "2025-03-01T00:00:00+00:00"
+
+
+def play(system):
+    """Бросок, переброс выведенных пар, добор персонажей и удаление"""
+    names = [f"Персонаж {number}" for number in range(12)]
+    system.add_characters(names, 1, DATE)
+    assert system.roll_missing(1, DATE) == 12 * 11
+    assert system.relationships.stored_count == 0
+    assert_consistent(system.relationships)
+
+    system.reroll([(names[0], names[1]), (names[2], names[3])], 2, LATER)
+    assert system.relationships.stored_count == 2
+    assert_consistent(system.relationships)
+
+    system.add_characters(["Новый 1", "Новый 2"], 3, LATER)
+    assert system.roll_missing(3, LAST) == 14 * 13 - 12 * 11
+    assert_consistent(system.relationships)
+
+    system.remove_character(names[3], 1)
+    assert_consistent(system.relationships)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_lazy_reload_is_deterministic(data_dir, monkeypatch, vectorized, backend):
+    monkeypatch.setenv("ROLL_MODE", "lazy")
+    monkeypatch.setenv("STORAGE_BACKEND", backend)
+    system = open_system()
+    play(system)
+    system.save_data()
+
+    restarted = open_system()
+    assert state(restarted) == state(system)
+    assert restarted.relationships.stored_count == system.relationships.stored_count
+    assert_consistent(restarted.relationships)
+    assert state(open_system()) == state(system)
+
+
+def test_stats_follow_changes_after_rebuild(data_dir, monkeypatch, vectorized):
+    monkeypatch.setenv("ROLL_MODE", "lazy")
+    system = open_system()
+    system.add_characters(["А", "Б", "В", "Г"], 1, DATE)
+    system.roll_missing(1, DATE)
+    # Агрегаты построены — дальше обновляются по каждому изменению
+    assert_consistent(system.relationships)
+    for _ in range(5):
+        system.reroll([("А", "Б"), ("Б", "А"), ("В", "Г")], 2, LATER)
+        assert_consistent(system.relationships)
+    system.remove_character("Б", 1)
+    assert_consistent(system.relationships)
+
+
+def test_estimated_size_counts_stored_cells(data_dir, monkeypatch):
+    monkeypatch.setenv("ROLL_MODE", "lazy")
+    system = open_system()
+    system.add_characters([f"Персонаж {number}" for number in range(200)], 1, DATE)
+    system.roll_missing(1, DATE)
+    assert len(system.relationships) == 200 * 199
+    assert system.estimated_size() == 200 * system.CHARACTER_BYTES
+
+    system.reroll([("Персонаж 0", "Персонаж 1")], 2, LATER)
+    assert system.estimated_size() == 200 * system.CHARACTER_BYTES + system.RELATIONSHIP_BYTES
+
+
+def test_eager_roll_after_lazy_fills_only_new_pairs(data_dir, monkeypatch, vectorized):
+    monkeypatch.setenv("ROLL_MODE", "lazy")
+    system = open_system()
+    system.add_characters(["А", "Б", "В"], 1, DATE)
+    system.roll_missing(1, DATE)
+    system.save_data()
+
+    monkeypatch.setenv("ROLL_MODE", "eager")
+    system = open_system()
+    assert system.roll_missing(1, LATER) == 0
+    system.add_character("Г", 1, LATER)
+    assert system.roll_missing(1, LATER) == 6
+    assert system.relationships.stored_count == 6
+    assert_consistent(system.relationships)
+    system.save_data()
+    assert state(open_system()) == state(system)
@@ -0,0 +1,95 @@
+"""Очередь изменений сервера: порядок, пакеты, ошибки и асинхронные изменения"""
+
+import asyncio
+
+import pytest
+
+from mutations import MutationQueue
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_mutations_run_in_order_and_batch_into_one_save():
+    async def scenario():
+        saves = []
+        log = []
+        queue = MutationQueue(lambda: saves.append(list(log)))
+        results = await asyncio.gather(*(queue.submit(log.append, number) for number in range(5)))
+        assert results == [None] * 5
+        assert log == [0, 1, 2, 3, 4]
+        assert saves == [[0, 1, 2, 3, 4]]
+        assert (queue.applied, queue.batches) == (5, 1)
+
+    run(scenario)
+
+
+def test_max_batch_splits_saves():
+    async def scenario():
+        saves = []
+        queue = MutationQueue(lambda: saves.append(queue.applied), max_batch=2)
+        await asyncio.gather(*(queue.submit(int, number) for number in range(5)))
+        assert saves == [2, 4, 5]
+
+    run(scenario)
+
+
+def test_error_reaches_its_caller_only():
+    async def scenario():
+        saves = []
+        queue = MutationQueue(lambda: saves.append(True))
+
+        def fail():
+            raise ValueError("плохое изменение")
+
+        results = await asyncio.gather(
+            queue.submit(str.upper, "а"), queue.submit(fail), queue.submit(str.upper, "б"),
+            return_exceptions=True,
+        )
+        assert results[0] == "А" and results[2] == "Б"
+        assert isinstance(results[1], ValueError)
+        assert saves == [True]
+
+        with pytest.raises(ValueError):
+            await queue.submit(fail)
+        assert saves == [True]  # Пакет без успешных изменений не сохраняется
+
+    run(scenario)
+
+
+def test_async_mutation_blocks_later_ones():
+    async def scenario():
+        log = []
+        queue = MutationQueue(lambda: None)
+
+        async def reload():
+            log.append("reload start")
+            await asyncio.sleep(0.01)
+            log.append("reload end")
+            return "перечитано"
+
+        first = asyncio.ensure_future(queue.submit(reload))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(queue.submit(log.append, "after"))
+        assert await first == "перечитано"
+        await second
+        await queue.drain()
+        assert log == ["reload start", "reload end", "after"]
+        assert len(queue) == 0
+
+    run(scenario)
+
+
+def test_cancelled_submit_is_skipped():
+    async def scenario():
+        log = []
+        queue = MutationQueue(lambda: None)
+        cancelled = asyncio.ensure_future(queue.submit(log.append, "отменено"))
+        kept = asyncio.ensure_future(queue.submit(log.append, "выполнено"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await kept
+        assert log == ["выполнено"]
+
+    run(scenario)
@@ -0,0 +1,47 @@
+"""Индекс имён: префиксы без учёта регистра, опечатки и удаление"""
+
+from name_index import NameIndex
+
+NAMES = ["Алиса", "Алексей", "алина", "Борис", "Александр Великий", "Вера"]
+
+
+def test_prefix_is_case_insensitive_and_shortest_first():
+    index = NameIndex(NAMES)
+    assert index.prefix("АЛ") == ["алина", "Алиса", "Алексей", "Александр Великий"]
+    assert index.prefix("ал", limit=2) == ["алина", "Алиса"]
+    assert index.prefix("Ж") == []
+
+
+def test_lookup_matches_whole_name_only():
+    index = NameIndex(NAMES + ["АЛИСА"])
+    assert index.lookup(" алиса ") == ["АЛИСА", "Алиса"]
+    assert index.lookup("Али") == []
+
+
+def test_complete_adds_similar_names_after_prefix_matches():
+    index = NameIndex(NAMES)
+    assert index.complete("Брис") == ["Борис"]
+    assert index.complete("Вер")[0] == "Вера"
+    assert index.fuzzy("Алиас", 3)[0] == "Алиса"
+    assert index.fuzzy("Ъъъ") == []
+    assert index.complete("   ") == index.prefix("", 25)
+
+
+def test_add_and_remove_keep_counts_and_prune_nodes():
+    index = NameIndex(NAMES)
+    assert len(index) == len(NAMES)
+    index.add("Алиса")
+    assert len(index) == len(NAMES)
+
+    index.remove("Алексей")
+    index.remove("Нет такого")
+    assert len(index) == len(NAMES) - 1
+    assert "Алексей" not in index.prefix("Але")
+    assert "Алексей" not in index.fuzzy("Алексей", 5)
+
+    for name in list(NAMES):
+        index.remove(name)
+    assert len(index) == 0
+    assert index.prefix("") == []
+    assert not index._root.children
+    assert not index._trigrams
@@ -0,0 +1,54 @@
+"""Реестр серверов: изменения команд, переживших вытеснение сервера"""
+
+import asyncio
+
+import bulk
+from conftest import DATE
+from Relationship_System import GuildRegistry
+
+LATER = "2025-02-01T00:00:00+00:00"
+
+
+async def evicted_system(registry):
+    """Система сервера 1, вытесненная загрузкой сервера 2"""
+    system = await registry.get(1)
+    await system.submit(system.add_characters, ["Алиса", "Борис"], 1, DATE)
+    await registry.get(2)
+    assert system.unloaded
+    return system
+
+
+def test_import_after_eviction_goes_to_reloaded_system(data_dir):
+    async def scenario():
+        registry = GuildRegistry(budget_bytes=1)
+        stale = await evicted_system(registry)
+        data = bulk.parse_import(
+            [("relationships.csv", "from,to,value\nАлиса,Борис,7\nВера,Алиса,3\n".encode())],
+            {"Алиса", "Борис", "Вера"},
+        )
+        data.characters.append("Вера")
+        assert await stale.submit(stale.apply_import, data, 1, LATER) == (1, 2)
+        current = await registry.get(1)
+        assert current is not stale
+        assert sorted(current.characters) == ["Алиса", "Борис", "Вера"]
+        assert current.relationships.get("Алиса", "Борис").value == 7
+        await registry.flush_all()
+
+    asyncio.run(scenario())
+
+
+def test_reroll_scope_after_eviction_goes_to_reloaded_system(data_dir):
+    async def scenario():
+        registry = GuildRegistry(budget_bytes=1)
+        system = await registry.get(1)
+        await system.submit(system.add_characters, ["Алиса", "Борис"], 1, DATE)
+        await system.submit(system.roll_missing, 1, DATE)
+        await registry.get(2)
+        assert system.unloaded
+        results = await system.submit(system.reroll_scope, "Алиса", "исходящие", 2, LATER)
+        assert [(from_char, to_char) for from_char, to_char, *_ in results] == [("Алиса", "Борис")]
+        current = await registry.get(1)
+        assert current.relationships.get("Алиса", "Борис").reroll.by == 2
+        await registry.flush_all()
+
+    asyncio.run(scenario())
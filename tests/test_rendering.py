@@ -0,0 +1,109 @@
+"""Разбиение вывода на страницы, плитки таблицы и лимиты embed"""
+
+import discord
+
+from conftest import DATE, open_system
+from rendering import (
+    EMBED_DESCRIPTION_LIMIT,
+    EMBED_FIELD_VALUE_LIMIT,
+    EMBED_FIELDS_LIMIT,
+    EMBED_TITLE_LIMIT,
+    EMBED_TOTAL_LIMIT,
+    EMBEDS_PER_MESSAGE,
+    PAGE_CHARS,
+    Renderer,
+    fit_embed,
+    group_embeds,
+    paginate_lines,
+    set_page_footers,
+)
+
+
+def test_paginate_lines_repeats_header_and_respects_limit():
+    lines = [f"строка {number}" for number in range(100)]
+    pages = paginate_lines(lines, "Заголовок\n", limit=120)
+    assert len(pages) > 1
+    assert all(page.startswith("Заголовок\n") and len(page) <= 120 for page in pages)
+    body = "".join(page[len("Заголовок\n"):] for page in pages)
+    assert body == "".join(line + "\n" for line in lines)
+
+
+def test_paginate_lines_clips_overlong_line():
+    pages = paginate_lines(["x" * 10_000], "H\n")
+    assert len(pages) == 1
+    assert len(pages[0]) <= PAGE_CHARS
+
+
+def test_paginate_lines_without_lines_gives_header_page():
+    assert paginate_lines([], "Пусто\n") == ["Пусто\n"]
+
+
+def test_page_footers_numbered_only_for_several_pages():
+    single = [discord.Embed(description="a")]
+    set_page_footers(single, "Легенда")
+    assert single[0].footer.text == "Легенда"
+
+    pages = [discord.Embed(description=str(number)) for number in range(3)]
+    set_page_footers(pages)
+    assert [embed.footer.text for embed in pages] == [f"Страница {n}/3" for n in (1, 2, 3)]
+
+
+def test_table_tiles_cover_every_cell(data_dir):
+    from Relationship_System import RELATIONSHIP_DESCRIPTIONS
+
+    system = open_system()
+    names = [f"Герой{number:02}" for number in range(20)]
+    system.add_characters(names, 1, DATE)
+    system.roll_missing(1, DATE)
+    system.remove_character(names[5], 1)
+    system.add_character("Новый", 1, DATE)
+    names = sorted(system.characters)
+
+    embeds = Renderer(RELATIONSHIP_DESCRIPTIONS).table(system)
+    assert len(embeds) > 1
+    cells = {}
+    for embed in embeds:
+        assert len(embed.description) <= EMBED_DESCRIPTION_LIMIT
+        header, _, *rows = embed.description.strip("`\n").split("\n")
+        columns = header.split()
+        for row in rows:
+            label, values = row[:14].strip(), row[15:].split()
+            for column, value in zip(columns, values):
+                cells[label, column] = value
+    assert len(cells) == len(names) ** 2
+    for from_char in names:
+        for to_char in names:
+            data = system.relationships.get(from_char, to_char)
+            expected = "—" if from_char == to_char else str(data.value) if data else "?"
+            assert cells[from_char, to_char] == expected
+
+
+def test_fit_embed_clips_parts_to_discord_limits():
+    embed = discord.Embed(title="т" * 300, description="о" * 5000)
+    for number in range(30):
+        embed.add_field(name=f"поле {number}", value="з" * 2000)
+    fit_embed(embed)
+    assert len(embed.title) == EMBED_TITLE_LIMIT and embed.title.endswith("…")
+    assert len(embed.description) <= EMBED_DESCRIPTION_LIMIT
+    assert len(embed.fields) <= EMBED_FIELDS_LIMIT
+    assert all(len(field.value) <= EMBED_FIELD_VALUE_LIMIT for field in embed.fields)
+    assert len(embed) <= EMBED_TOTAL_LIMIT
+
+
+def test_fit_embed_keeps_small_embed_unchanged():
+    embed = discord.Embed(title="Таблица", description="строка")
+    embed.add_field(name="Легенда", value="1: ...", inline=False)
+    before = embed.to_dict()
+    assert fit_embed(embed).to_dict() == before
+
+
+def test_group_embeds_respects_count_and_size_per_message():
+    small = [discord.Embed(description=str(number)) for number in range(25)]
+    groups = group_embeds(small)
+    assert [len(group) for group in groups] == [EMBEDS_PER_MESSAGE, EMBEDS_PER_MESSAGE, 5]
+    assert [embed for group in groups for embed in group] == small
+
+    large = [discord.Embed(description="x" * 3500) for _ in range(3)]
+    groups = group_embeds(large)
+    assert [len(group) for group in groups] == [1, 1, 1]
+    assert all(sum(len(embed) for embed in group) <= EMBED_TOTAL_LIMIT for group in groups)
@@ -0,0 +1,46 @@
+"""Переброс: правило корректировки значения и векторный путь NumPy"""
+
+from conftest import DATE, open_system
+from roll_engine import RollEngine, adjust_value
+
+LATER = "2025-02-01T00:00:00+00:00"
+
+
+def test_adjust_value_rule():
+    assert adjust_value(5, 6) == 6  # Бросок больше — +1
+    assert adjust_value(10, 10) == 10
+    assert adjust_value(9, 10) == 10
+    assert adjust_value(5, 1) == 4  # Единица — −1
+    assert adjust_value(1, 1) == 1
+    assert adjust_value(5, 5) == 5  # Иначе без изменений
+    assert adjust_value(5, 2) == 5
+
+
+def test_engine_reroll_follows_rule(vectorized):
+    engine = RollEngine()
+    old = [value for value in range(1, 11) for _ in range(200)]
+    rolls, new = engine.reroll(old)
+    assert len(rolls) == len(new) == len(old)
+    assert all(1 <= roll <= 10 for roll in rolls)
+    assert all(type(value) is int for value in rolls + new)
+    assert new == [adjust_value(value, roll) for value, roll in zip(old, rolls)]
+    assert engine.reroll([]) == ([], [])
+
+
+def test_system_reroll_keeps_original_roll(data_dir, vectorized):
+    system = open_system()
+    system.add_characters(["Алиса", "Борис"], 1, DATE)
+    system.roll_missing(1, DATE)
+    before = system.relationships.get("Алиса", "Борис")
+
+    results = system.reroll([("Алиса", "Борис"), ("Алиса", "Нет такого")], 2, LATER)
+    assert len(results) == 1
+    from_char, to_char, old, roll, new = results[0]
+    assert (from_char, to_char, old) == ("Алиса", "Борис", before.value)
+    assert new == adjust_value(old, roll)
+
+    after = system.relationships.get("Алиса", "Борис")
+    assert after.value == new
+    assert (after.roll.by, after.roll.date) == (1, DATE)
+    assert (after.reroll.by, after.reroll.date) == (2, LATER)
+    assert system.reroll([("Нет такого", "Алиса")], 2, LATER) == []
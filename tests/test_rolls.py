@@ -0,0 +1,41 @@
+"""Обычный (eager) бросок: индексы, агрегаты и запись в оба хранилища"""
+
+import pytest
+
+from conftest import DATE, assert_consistent, open_system, state
+
+LATER = "2025-02-01T00:00:00+00:00"
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_roll_then_fill_new_characters(data_dir, monkeypatch, vectorized, backend):
+    monkeypatch.setenv("STORAGE_BACKEND", backend)
+    system = open_system()
+    names = [f"Персонаж {number}" for number in range(30)]
+    system.add_characters(names, 1, DATE)
+    assert system.roll_missing(1, DATE) == 30 * 29
+    assert_consistent(system.relationships)
+
+    # Импорт задаёт одно направление, бросок — обратное: взаимная любовь
+    # новой ячейки проверяется и по уже хранимым
+    new = [f"Новый {number}" for number in range(10)]
+    imported = {(name, other): {"value": 10} for name in new for other in names[1:6]}
+    system.import_data(new, imported, 2, LATER)
+    system.remove_character(names[0], 1)
+    assert system.roll_missing(2, LATER) == 39 * 38 - 29 * 28 - len(imported)
+    assert system.roll_missing(2, LATER) == 0
+    assert_consistent(system.relationships)
+
+    system.save_data()
+    restarted = open_system()
+    assert state(restarted) == state(system)
+    assert_consistent(restarted.relationships)
+
+
+def test_json_roll_keeps_only_journal_op(data_dir):
+    system = open_system()
+    system.add_characters(["Алиса", "Борис", "Вера"], 1, DATE)
+    system.roll_missing(1, DATE)
+    assert not system.changes.relationships
+    assert [op["op"] for op in system.changes.ops] == ["add", "add", "add", "roll"]
+    assert len(system.changes.ops[-1]["cells"]) == 3 * 6
@@ -0,0 +1,16 @@
+"""Хранилище: старые общие файлы в корне (до разделения по серверам)"""
+
+import json
+
+from storage import warn_unclaimed_legacy_files
+
+
+def test_warns_about_unclaimed_legacy_files(data_dir, monkeypatch, capsys):
+    assert not warn_unclaimed_legacy_files()
+    with open("characters.json", "w", encoding="utf-8") as f:
+        json.dump({"Алиса": {}}, f)
+    assert warn_unclaimed_legacy_files()
+    assert "LEGACY_GUILD_ID" in capsys.readouterr().out
+
+    monkeypatch.setenv("LEGACY_GUILD_ID", "1")
+    assert not warn_unclaimed_legacy_files()